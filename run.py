@@ -12,6 +12,12 @@ from showgo import create_app # Import the factory function
 app = create_app()
 
 if __name__ == '__main__':
+    # The Werkzeug dev server handles one request at a time; production deploys
+    # should use wsgi.py under Gunicorn. Require an explicit opt-in here.
+    if not os.environ.get('SHOWGO_DEV'):
+        raise SystemExit("run.py starts the development server. Set SHOWGO_DEV=1 to use it, or run:\n"
+                         "  gunicorn -w 4 -k gthread --threads 4 -b 0.0.0.0:5000 wsgi:application")
+
     # Get host and debug settings (consider environment variables for production)
     host = os.environ.get('FLASK_RUN_HOST', '0.0.0.0')
     debug = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
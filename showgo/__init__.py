@@ -1,10 +1,12 @@
 # showgo/__init__.py
 
 import os
+import hmac
 import traceback # Keep traceback for potential error logging here too
-from flask import Flask
-from .config import Config, DEFAULT_SETTINGS_DB # Import configuration and defaults
-from .extensions import db, auth # Import initialized extensions
+from flask import Flask, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+from .config import Config, DEFAULT_SETTINGS_DB, ORJSON_AVAILABLE, ensure_folders # Import configuration and defaults
+from .extensions import db, auth, OrjsonJSONProvider # Import initialized extensions
 from .models import Setting, MediaFile # Import models to ensure they are known to SQLAlchemy
 
 # Import Blueprints
@@ -14,10 +16,12 @@ from .cli import db_cli_bp # Import CLI commands blueprint
 
 # Import utility functions needed during app creation or globally
 from .utils import initialize_database, load_settings_from_db # Import DB functions
+from .utils import get_auth_credentials, check_password_cached, get_dummy_password_hash, UploadRequest
+from .utils import LoginThrottled
 
 # Import specific exceptions for error handlers
 # *** ADDED RequestEntityTooLarge HERE ***
-from werkzeug.exceptions import NotFound, InternalServerError, RequestEntityTooLarge
+from werkzeug.exceptions import NotFound, InternalServerError, RequestEntityTooLarge, TooManyRequests
 from sqlalchemy.exc import OperationalError
 
 
@@ -33,6 +37,31 @@ def create_app(config_class=Config):
     # Load configuration from config object
     app.config.from_object(config_class)
 
+    # Serve JSON (jsonify, tojson) through orjson when it is installed
+    if ORJSON_AVAILABLE:
+        app.json = OrjsonJSONProvider(app)
+
+    # Ensure essential folders exist (done here rather than at import time, so
+    # importing the package for CLI help or tooling has no filesystem side effects)
+    ensure_folders(
+        ("Instance", app.config['INSTANCE_FOLDER_PATH']),
+        ("Uploads", app.config['UPLOAD_FOLDER']),
+        ("Thumbnails", app.config['THUMBNAIL_FOLDER']),
+        ("Assets", app.config['ASSETS_FOLDER']),
+        ("Upload temp", app.config['UPLOAD_TMP_FOLDER']),
+    )
+    # Take the client address from the reverse proxy's headers when one is configured
+    if app.config.get('PROXY_FIX_X_FOR'):
+        hops = app.config['PROXY_FIX_X_FOR']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    # Spool large uploads next to the data folders so they can be linked into place
+    app.request_class = UploadRequest
+
+    # Precompute per-request constants for serve_thumbnail
+    app.config['PLACEHOLDER_THUMB_EXISTS'] = os.path.isfile(
+        os.path.join(app.static_folder, 'images', 'placeholder_thumb.png'))
+
     # Initialize Flask extensions that use init_app
     db.init_app(app)
     # auth is initialized in extensions.py and used via decorators
@@ -41,20 +70,24 @@ def create_app(config_class=Config):
         # Load specific image processing settings from DB into app.config
         # These will override the defaults from config.py if they exist in the DB.
         try:
-            max_res_setting = Setting.query.filter_by(key='DEFAULT_MAX_RESOLUTION').first()
-            if max_res_setting and max_res_setting.value is not None:
-                app.config['DEFAULT_MAX_RESOLUTION'] = max_res_setting.value
-                print(f"Loaded DEFAULT_MAX_RESOLUTION from DB: {max_res_setting.value}")
-
-            convert_webp_setting = Setting.query.filter_by(key='CONVERT_TO_WEBP').first()
-            if convert_webp_setting and convert_webp_setting.value is not None:
-                app.config['CONVERT_TO_WEBP'] = convert_webp_setting.get_bool() # Use get_bool for boolean settings
-                print(f"Loaded CONVERT_TO_WEBP from DB: {convert_webp_setting.get_bool()}")
-
-            webp_quality_setting = Setting.query.filter_by(key='WEBP_QUALITY').first()
-            if webp_quality_setting and webp_quality_setting.value is not None:
-                app.config['WEBP_QUALITY'] = int(webp_quality_setting.value) # Ensure it's an int
-                print(f"Loaded WEBP_QUALITY from DB: {int(webp_quality_setting.value)}")
+            # Select only the value column; these lookups never need the whole row
+            def setting_value(key):
+                return db.session.scalar(db.select(Setting.value).where(Setting.key == key))
+
+            max_res_value = setting_value('DEFAULT_MAX_RESOLUTION')
+            if max_res_value is not None:
+                app.config['DEFAULT_MAX_RESOLUTION'] = max_res_value
+                print(f"Loaded DEFAULT_MAX_RESOLUTION from DB: {max_res_value}")
+
+            convert_webp_value = setting_value('CONVERT_TO_WEBP')
+            if convert_webp_value is not None:
+                app.config['CONVERT_TO_WEBP'] = bool(convert_webp_value) # Stored as a JSON boolean
+                print(f"Loaded CONVERT_TO_WEBP from DB: {bool(convert_webp_value)}")
+
+            webp_quality_value = setting_value('WEBP_QUALITY')
+            if webp_quality_value is not None:
+                app.config['WEBP_QUALITY'] = int(webp_quality_value) # Ensure it's an int
+                print(f"Loaded WEBP_QUALITY from DB: {int(webp_quality_value)}")
             
         except OperationalError as oe:
             print(f"WARNING: Database operational error while trying to load image settings: {oe}")
@@ -80,8 +113,13 @@ def create_app(config_class=Config):
 
             # Check for PIL here if needed, store in app.config
             try:
+                import PIL
                 from PIL import Image, UnidentifiedImageError
                 app.config['PIL_AVAILABLE'] = True
+                # Pillow-SIMD is a drop-in fork; its versions carry a '.postN' suffix
+                app.config['PIL_SIMD'] = '.post' in getattr(PIL, '__version__', '')
+                if app.config['PIL_SIMD']:
+                    print(f"Pillow-SIMD detected ({PIL.__version__}): accelerated resampling active.")
             except ImportError:
                 app.config['PIL_AVAILABLE'] = False
                 print("WARNING: Pillow library not found during app creation.")
@@ -103,29 +141,35 @@ def create_app(config_class=Config):
 
     # --- Define verify_password here, associated with the 'auth' instance ---
     @auth.verify_password
-    def verify_password(username, password):
+    def verify_password(username, password, _request=request, _compare=hmac.compare_digest,
+                        _credentials=get_auth_credentials, _check=check_password_cached,
+                        _dummy_hash=get_dummy_password_hash):
         """Verify user credentials against stored settings."""
-        from werkzeug.security import check_password_hash
-        # Import get_setting from utils INSIDE the function if needed
-        from .utils import get_setting
-
-        stored_username = get_setting('auth_username', 'admin')
-        stored_password_hash = get_setting('auth_password_hash')
-
-        if username == stored_username and stored_password_hash:
-            try:
-                is_valid = check_password_hash(stored_password_hash, password)
-                return is_valid
-            except Exception as e:
-                print(f"ERROR: Exception during check_password_hash: {e}")
-                traceback.print_exc()
-                return False
-        else:
+        # Runs on every authenticated request; helpers are bound as default arguments
+        # so each lookup is a local rather than a global/import lookup.
+        stored_username, stored_password_hash = _credentials()
+
+        # compare_digest doesn't short-circuit, so response time doesn't reveal the username
+        username_matches = _compare((username or '').encode('utf-8'),
+                                    str(stored_username).encode('utf-8'))
+        client_id = _request.remote_addr
+        try:
+            if username_matches and stored_password_hash:
+                return _check(stored_password_hash, password or '', client_id)
+            # Run the same KDF for unknown users so they take as long as a wrong password
+            _check(_dummy_hash(), password or '', client_id)
+            return False
+        except LoginThrottled as e:
+            # Answer 429 rather than 401 so a throttled client isn't told its password is wrong
+            raise TooManyRequests(retry_after=e.retry_after)
+        except Exception as e:
+            print(f"ERROR: Exception during check_password_hash: {e}")
+            traceback.print_exc()
             return False
 
     # --- Register global error handlers ---
     # Import the handler functions from the new errors module
-    from .errors import page_not_found, internal_server_error, request_entity_too_large
+    from .errors import page_not_found, internal_server_error, request_entity_too_large, too_many_requests
 
     app.register_error_handler(404, page_not_found)
     app.register_error_handler(NotFound, page_not_found) # Also register specific exception
@@ -134,6 +178,7 @@ def create_app(config_class=Config):
     app.register_error_handler(Exception, internal_server_error) # Catch broader Python exceptions
     app.register_error_handler(413, request_entity_too_large)
     app.register_error_handler(RequestEntityTooLarge, request_entity_too_large) # Also register specific exception
+    app.register_error_handler(TooManyRequests, too_many_requests) # Otherwise the Exception handler makes it a 500
     # --- End Error Handler Registration ---
 
     return app
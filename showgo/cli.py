@@ -3,7 +3,7 @@
 
 import click
 from flask import Blueprint
-from .utils import initialize_database # Import the shared init function
+from .utils import initialize_database, get_database_media, regenerate_thumbnails_bulk # Import the shared helpers
 
 # Create a Blueprint for CLI commands
 db_cli_bp = Blueprint('db_cli', __name__, cli_group='db')
@@ -17,6 +17,15 @@ def init_db_command():
     else:
         print("Database initialization command failed. Check logs for errors.")
 
+@db_cli_bp.cli.command('regenerate-thumbnails')
+@click.option('--all', 'regenerate_all', is_flag=True, help='Rebuild every thumbnail, not just missing ones.')
+def regenerate_thumbnails_command(regenerate_all):
+    """Regenerates media thumbnails in parallel (missing ones by default)."""
+    media_records, _ = get_database_media()
+    print(f"Regenerating thumbnails for {'all' if regenerate_all else 'missing'} of {len(media_records)} media item(s)...")
+    generated, failed = regenerate_thumbnails_bulk(media_records, missing_only=not regenerate_all)
+    print(f"Thumbnail regeneration complete: {generated} generated, {failed} failed.")
+
 # You can add more CLI commands here later if needed
 # Example:
 # @db_cli_bp.cli.command('clear-images')
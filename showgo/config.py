@@ -1,9 +1,27 @@
 # showgo/config.py
 import os
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash
 from datetime import datetime, timezone
 
+# --- Optional orjson Check ---
+# orjson is a C JSON codec; when installed it encodes/decodes the settings table's
+# JSON column. The stdlib json module is used otherwise.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _orjson_dumps(obj):
+    """SQLAlchemy's json_serializer must return str; orjson returns bytes."""
+    return orjson.dumps(obj).decode('utf-8')
+
+def _orjson_loads(value):
+    """SQLite hands bare JSON numbers back as int/float (NUMERIC affinity); pass them through."""
+    if isinstance(value, (int, float)):
+        return value
+    return orjson.loads(value)
+
 # Load environment variables from .env file at the root
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 if os.path.exists(dotenv_path):
@@ -26,10 +44,18 @@ WEBP_QUALITY = 85             # Default WebP quality setting
 WEBP_METHOD = 4
 
 # Allowed file extensions
-ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'webm', 'ogg'}
-ALLOWED_VIDEO_CODECS = {'h264', 'vp9', 'av1'}
-ALLOWED_AUDIO_CODECS = {'aac', 'opus', 'mp3', 'vorbis'}
+ALLOWED_IMAGE_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
+ALLOWED_VIDEO_EXTENSIONS = frozenset({'mp4', 'webm', 'ogg'})
+ALLOWED_VIDEO_CODECS = frozenset({'h264', 'vp9', 'av1'})
+ALLOWED_AUDIO_CODECS = frozenset({'aac', 'opus', 'mp3', 'vorbis'})
+
+# Initial admin password, replaced on first login via the set-initial-password page
+DEFAULT_PASSWORD = "showgo"
+# Password hashing method for werkzeug's generate_password_hash. Werkzeug's default cost
+# targets public web logins; ShowGo has a single admin on a local network, so a lighter
+# PBKDF2 iteration count keeps each uncached login check around 10ms on small boards.
+# Existing hashes keep verifying because the method is stored inside each hash.
+PASSWORD_HASH_METHOD = "pbkdf2:sha256:50000"
 
 # --- Default Settings ---
 DEFAULT_SETTINGS_DB = {
@@ -76,7 +102,8 @@ DEFAULT_SETTINGS_DB = {
 
     # Auth
     "auth_username": "admin",
-    "auth_password_hash": generate_password_hash("showgo"),
+    # Hashed on first database initialization rather than at import time (see initialize_database)
+    "auth_password_hash": None,
     "auth_password_changed": False,
 
     # Burn-in Prevention
@@ -87,10 +114,76 @@ DEFAULT_SETTINGS_DB = {
     "burn_in_prevention_strength_pixels": 3,
 
     # Media Timestamp
-    "media_last_changed": datetime.now(timezone.utc).timestamp()
+    "media_last_changed": datetime.now(timezone.utc).timestamp(),
+    # Bumped for config changes that aren't settings rows (e.g. a new overlay logo)
+    "config_last_changed": datetime.now(timezone.utc).timestamp()
+}
+
+# --- Nested Settings Layout ---
+# Maps the nested structure used by the templates onto the flat DB keys above.
+# A string value names a settings key; a dict value is a nested group.
+SETTINGS_LAYOUT = {
+    "slideshow": {
+        "duration_seconds": "slideshow_duration_seconds",
+        "transition_effect": "slideshow_transition_effect",
+        "image_order": "slideshow_image_order",
+        "image_scaling": "slideshow_image_scaling",
+        "video_scaling": "slideshow_video_scaling",
+        "video_autoplay": "slideshow_video_autoplay",
+        "video_loop": "slideshow_video_loop",
+        "video_muted": "slideshow_video_muted",
+        "video_show_controls": "slideshow_video_show_controls",
+        "video_duration_limit_enabled": "slideshow_video_duration_limit_enabled",
+        "video_duration_limit_seconds": "slideshow_video_duration_limit_seconds",
+        "video_random_start_enabled": "slideshow_video_random_start_enabled",
+    },
+    "overlay": {
+        "enabled": "overlay_enabled",
+        "text": "overlay_text",
+        "position": "overlay_position",
+        "font_size": "overlay_font_size",
+        "font_color": "overlay_font_color",
+        "logo_enabled": "overlay_logo_enabled",
+        "display_mode": "overlay_display_mode",
+        "background_color": "overlay_background_color",
+        "padding": "overlay_padding",
+    },
+    "widgets": {
+        "time": {"enabled": "widgets_time_enabled"},
+        "weather": {
+            "enabled": "widgets_weather_enabled",
+            "location": "widgets_weather_location",
+        },
+        "rss": {
+            "enabled": "widgets_rss_enabled",
+            "feed_url": "widgets_rss_feed_url",
+            "scroll_speed": "widgets_rss_scroll_speed",
+        },
+    },
+    "burn_in_prevention": {
+        "enabled": "burn_in_prevention_enabled",
+        "elements": "burn_in_prevention_elements",
+        "interval_seconds": "burn_in_prevention_interval_seconds",
+        "strength_pixels": "burn_in_prevention_strength_pixels",
+    },
 }
 
 
+def ensure_folders(*labelled_folders):
+    """Creates any missing (label, path) folders. Existing ones cost a single failed mkdir."""
+    for label, folder in labelled_folders:
+        try:
+            try:
+                os.mkdir(folder)
+            except FileNotFoundError:
+                os.makedirs(folder, exist_ok=True) # Parent missing too; fall back to the full walk
+            print(f"{label} folder created: {folder}")
+        except FileExistsError:
+            continue
+        except OSError as e:
+            print(f"ERROR: Could not create essential directory: {e}")
+
+
 # --- Base Configuration Class ---
 class Config:
     """Base configuration settings."""
@@ -116,33 +209,46 @@ class Config:
     OVERLAY_LOGO_FILENAME = 'overlay_logo.png' # Predefined filename for the logo
 
     # SQLite Database configuration
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(INSTANCE_FOLDER_PATH, 'showgo.db')}"
+    DATABASE_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'showgo.db')
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'json_serializer': _orjson_dumps,
+        'json_deserializer': _orjson_loads,
+    } if ORJSON_AVAILABLE else {}
     print(f"Using SQLite database at: {SQLALCHEMY_DATABASE_URI}")
 
-    # Ensure essential folders exist
-    try:
-        os.makedirs(INSTANCE_FOLDER_PATH, exist_ok=True)
-        print(f"Instance folder checked/created: {INSTANCE_FOLDER_PATH}")
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        print(f"Uploads folder checked/created: {UPLOAD_FOLDER}")
-        os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
-        print(f"Thumbnails folder checked/created: {THUMBNAIL_FOLDER}")
-        # *** ADDED: Ensure ASSETS_FOLDER exists ***
-        os.makedirs(ASSETS_FOLDER, exist_ok=True)
-        print(f"Assets folder checked/created: {ASSETS_FOLDER}")
-    except OSError as e:
-        print(f"ERROR: Could not create essential directory: {e}")
-
     # Upload/Thumbnail settings
     MAX_CONTENT_LENGTH = 512 * 1024 * 1024 # 512MB
+    UPLOAD_BUFFER_SIZE = 256 * 1024 # Copy buffer for streaming uploads to disk
+    # Large uploads are spooled here (not the system temp dir) and hard-linked into UPLOAD_FOLDER
+    UPLOAD_TMP_FOLDER = os.path.join(INSTANCE_FOLDER_PATH, 'upload_tmp')
     ALLOWED_IMAGE_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS
     ALLOWED_VIDEO_EXTENSIONS = ALLOWED_VIDEO_EXTENSIONS
     ALLOWED_EXTENSIONS = ALLOWED_IMAGE_EXTENSIONS.union(ALLOWED_VIDEO_EXTENSIONS)
+    ALLOWED_SUFFIXES = tuple(f".{ext}" for ext in ALLOWED_EXTENSIONS) # For str.endswith checks
     ALLOWED_VIDEO_CODECS = ALLOWED_VIDEO_CODECS
     ALLOWED_AUDIO_CODECS = ALLOWED_AUDIO_CODECS
     THUMBNAIL_SIZE = (150, 150)
     THUMBNAIL_FORMAT = 'PNG' # Thumbnails will remain PNG
     THUMBNAIL_EXT = f".{THUMBNAIL_FORMAT.lower()}"
+    # Background thumbnail threads; unset means one per CPU (minimum 2)
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS') or 0) or None
+
+    # Weather/RSS widget data is refreshed in the background at this interval
+    WIDGET_REFRESH_SECONDS = int(os.environ.get('WIDGET_REFRESH_SECONDS') or 300)
+
+    # Auth
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or PASSWORD_HASH_METHOD
+
+    # Reverse-proxy file offload (off by default; the Flask routes stream files themselves)
+    # USE_X_SENDFILE: emit X-Sendfile headers for Apache mod_xsendfile / lighttpd.
+    # X_ACCEL_REDIRECT_PREFIX: nginx 'internal' location prefix, e.g. '/internal'.
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX') or None
+    # Number of reverse proxies in front of the app whose X-Forwarded-For/-Proto headers
+    # are trusted (0 = none). Login throttling keys on the client address, so behind
+    # nginx this must be set or every client shares the proxy's address.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
 
     # Make defaults accessible via app config
     DEFAULT_SETTINGS_DB = DEFAULT_SETTINGS_DB
@@ -7,21 +7,24 @@ import uuid
 from functools import wraps
 from datetime import datetime, timezone # Import datetime and timezone
 from flask import (Blueprint, render_template, request, redirect, url_for,
-                   flash, make_response, current_app, send_from_directory)
+                   flash, make_response, current_app, send_from_directory, session)
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.exceptions import RequestEntityTooLarge
 
 # Import extensions, models, utils from the application package (.)
 from .extensions import db, auth
 from .models import MediaFile, Setting
-from .utils import (get_setting, save_setting, initialize_database,
+from .utils import (get_setting, save_setting, save_settings, initialize_database,
+                    get_nested_settings_view,
                     get_database_media, find_missing_media_files,
                     find_unexpected_items, cleanup_unexpected_items,
                     remove_missing_media_db_entries,
-                    allowed_file, generate_thumbnail, get_media_type,
-                    is_web_friendly_video)
-from .config import DEFAULT_SETTINGS_DB # Import defaults for fallback
+                    allowed_file, submit_thumbnail_job, get_media_type,
+                    is_web_friendly_video, save_uploaded_file, sync_folder,
+                    reuse_existing_thumbnail, get_media_state_etag, hash_password,
+                    check_password_cached, LoginThrottled,
+                    forget_existing_thumbnails)
+from .config import DEFAULT_SETTINGS_DB, DEFAULT_PASSWORD # Import defaults for fallback
 from .image_processing import process_image
 
 # Create Blueprint
@@ -50,15 +53,105 @@ def _touch_media_timestamp():
 
 # --- Helper to update general config timestamp (used by settings and logo upload) ---
 def _touch_config_timestamp():
-    """Touches a general configuration setting to update its last_updated timestamp."""
+    """Updates the config_last_changed setting so the config timestamp moves forward."""
     try:
-        current_value = get_setting('overlay_enabled', False)
-        save_setting('overlay_enabled', current_value)
-        print(f"Touched general config timestamp by re-saving 'overlay_enabled'.")
+        # save_setting skips unchanged values, so write one that always differs
+        now_ts = datetime.now(timezone.utc).timestamp()
+        save_setting('config_last_changed', now_ts)
+        current_app.logger.debug("Touched general config timestamp via 'config_last_changed'.")
     except Exception as e:
         print(f"ERROR: Failed to touch general config timestamp: {e}")
 
 
+# --- General Settings Form Schema ---
+# One row per field on the general settings page: (settings key, form field, kind, options).
+#   'text'     - form value, or the default when the field is absent
+#   'checkbox' - True when the field was submitted
+#   'on'       - True only when the field was submitted with the value 'on'
+#   'int'      - int() of the value, clamped to options=(min, max) when given
+#   'choice'   - options=(allowed values, warning); anything else becomes the default,
+#                flashing warning (formatted with {value}) unless it is None
+#   'list'     - all submitted values for the field
+GENERAL_FORM_SCHEMA = [
+    # Slideshow General Settings
+    ('slideshow_transition_effect', 'transition_effect', 'choice',
+     (('fade', 'slide', 'kenburns'), "Invalid transition effect '{value}'. Defaulting.")),
+    ('slideshow_duration_seconds', 'duration_seconds', 'int', None),
+    ('slideshow_image_order', 'image_order', 'text', None),
+    ('slideshow_image_scaling', 'image_scaling', 'text', None),
+    # Video Settings
+    ('slideshow_video_scaling', 'video_scaling', 'text', None),
+    ('slideshow_video_autoplay', 'video_autoplay', 'checkbox', None),
+    ('slideshow_video_loop', 'video_loop', 'checkbox', None),
+    ('slideshow_video_muted', 'video_muted', 'checkbox', None),
+    ('slideshow_video_show_controls', 'video_show_controls', 'checkbox', None),
+    ('slideshow_video_duration_limit_enabled', 'video_duration_limit_enabled', 'on', None),
+    ('slideshow_video_duration_limit_seconds', 'video_duration_limit_seconds', 'int', (1, 3600)),
+    ('slideshow_video_random_start_enabled', 'video_random_start_enabled', 'on', None),
+    # Overlay Branding Settings
+    ('overlay_enabled', 'overlay_enabled', 'checkbox', None),
+    ('overlay_text', 'overlay_text', 'text', None),
+    ('overlay_position', 'overlay_position', 'text', None),
+    ('overlay_font_size', 'overlay_font_size', 'text', None),
+    ('overlay_font_color', 'overlay_font_color', 'text', None),
+    ('overlay_logo_enabled', 'overlay_logo_enabled', 'checkbox', None),
+    ('overlay_display_mode', 'overlay_display_mode', 'choice',
+     (('text_only', 'logo_only', 'logo_and_text_side', 'logo_and_text_below'), None)),
+    ('overlay_background_color', 'overlay_background_color', 'text', None),
+    ('overlay_padding', 'overlay_padding', 'text', None),
+    # Widget Settings
+    ('widgets_time_enabled', 'time_widget_enabled', 'checkbox', None),
+    ('widgets_weather_enabled', 'weather_widget_enabled', 'checkbox', None),
+    ('widgets_weather_location', 'weather_location', 'text', None),
+    ('widgets_rss_enabled', 'rss_widget_enabled', 'checkbox', None),
+    ('widgets_rss_feed_url', 'rss_feed_url', 'text', None),
+    ('widgets_rss_scroll_speed', 'rss_scroll_speed', 'choice',
+     (('slow', 'medium', 'fast'), "Invalid RSS scroll speed '{value}'. Defaulting.")),
+    # Burn-in Settings
+    ('burn_in_prevention_enabled', 'burn_in_prevention_enabled', 'checkbox', None),
+    ('burn_in_prevention_elements', 'burn_in_elements', 'list', None),
+    ('burn_in_prevention_interval_seconds', 'burn_in_interval_seconds', 'int', None),
+    ('burn_in_prevention_strength_pixels', 'burn_in_strength_pixels', 'int', None),
+]
+
+def _parse_general_form(form):
+    """Parses the general settings form in a single pass over GENERAL_FORM_SCHEMA.
+
+    Returns (values, invalid_fields). A field that fails int() is skipped and reported
+    instead of aborting the whole save.
+    """
+    values = {}
+    invalid_fields = []
+    for key, field, kind, options in GENERAL_FORM_SCHEMA:
+        default = DEFAULT_SETTINGS_DB[key]
+        if kind == 'checkbox':
+            values[key] = field in form
+        elif kind == 'on':
+            values[key] = form.get(field) == 'on'
+        elif kind == 'list':
+            values[key] = form.getlist(field)
+        elif kind == 'int':
+            try:
+                value = int(form.get(field, default))
+            except (TypeError, ValueError):
+                invalid_fields.append(field)
+                continue
+            if options:
+                value = min(max(value, options[0]), options[1])
+            values[key] = value
+        elif kind == 'choice':
+            allowed, warning = options
+            value = form.get(field, default)
+            if value not in allowed:
+                if warning:
+                    flash(warning.format(value=value), "warning")
+                value = default
+            values[key] = value
+        else:
+            values[key] = form.get(field, default)
+    return values, invalid_fields
+
+
 # --- Routes ---
 
 @config_bp.route('/')
@@ -83,11 +176,11 @@ def config_set_initial_password():
         if new_password != confirm_password:
             flash("New password and confirmation do not match.", "error")
             return redirect(url_for('.config_set_initial_password'))
-        if new_password == "showgo":
+        if new_password == DEFAULT_PASSWORD:
             flash("New password cannot be the default password.", "error")
             return redirect(url_for('.config_set_initial_password'))
         try:
-            new_hash = generate_password_hash(new_password)
+            new_hash = hash_password(new_password)
             saved_hash = save_setting('auth_password_hash', new_hash)
             saved_flag = save_setting('auth_password_changed', True)
             if saved_hash and saved_flag:
@@ -110,83 +203,25 @@ def config_set_initial_password():
 def config_general():
     """Displays and handles saving of general slideshow/widget/display settings."""
     if request.method == 'POST':
-        # ... (POST logic remains the same as the previous version) ...
         settings_saved_successfully = True
         try:
-            # Slideshow General Settings
-            allowed_transitions = ['fade', 'slide', 'kenburns']
-            transition = request.form.get('transition_effect', DEFAULT_SETTINGS_DB['slideshow_transition_effect'])
-            if transition not in allowed_transitions:
-                flash(f"Invalid transition effect '{transition}'. Defaulting.", "warning")
-                transition = DEFAULT_SETTINGS_DB['slideshow_transition_effect']
-            settings_saved_successfully &= save_setting('slideshow_transition_effect', transition)
-            settings_saved_successfully &= save_setting('slideshow_duration_seconds', int(request.form.get('duration_seconds', DEFAULT_SETTINGS_DB['slideshow_duration_seconds'])))
-            settings_saved_successfully &= save_setting('slideshow_image_order', request.form.get('image_order', DEFAULT_SETTINGS_DB['slideshow_image_order']))
-            settings_saved_successfully &= save_setting('slideshow_image_scaling', request.form.get('image_scaling', DEFAULT_SETTINGS_DB['slideshow_image_scaling']))
-            # Video Settings (General)
-            settings_saved_successfully &= save_setting('slideshow_video_scaling', request.form.get('video_scaling', DEFAULT_SETTINGS_DB['slideshow_video_scaling']))
-            settings_saved_successfully &= save_setting('slideshow_video_autoplay', 'video_autoplay' in request.form)
-            settings_saved_successfully &= save_setting('slideshow_video_loop', 'video_loop' in request.form)
-            settings_saved_successfully &= save_setting('slideshow_video_muted', 'video_muted' in request.form)
-            settings_saved_successfully &= save_setting('slideshow_video_show_controls', 'video_show_controls' in request.form)
-            
-            # Video Playback Advanced Settings
-            duration_limit_enabled = request.form.get('video_duration_limit_enabled') == 'on'
-            duration_limit_seconds = int(request.form.get('video_duration_limit_seconds', 30))
-            random_start_enabled = request.form.get('video_random_start_enabled') == 'on'
-
-            # Validate duration limit
-            if duration_limit_seconds < 1:
-                duration_limit_seconds = 1
-            elif duration_limit_seconds > 3600:
-                duration_limit_seconds = 3600
+            values, invalid_fields = _parse_general_form(request.form)
 
             # If duration limit is disabled, ensure random start is also disabled
-            if not duration_limit_enabled:
-                random_start_enabled = False
-
-            settings_saved_successfully &= save_setting('slideshow_video_duration_limit_enabled', duration_limit_enabled)
-            settings_saved_successfully &= save_setting('slideshow_video_duration_limit_seconds', duration_limit_seconds)
-            settings_saved_successfully &= save_setting('slideshow_video_random_start_enabled', random_start_enabled)
-
-            # Overlay Branding Settings
-            settings_saved_successfully &= save_setting('overlay_enabled', 'overlay_enabled' in request.form)
-            settings_saved_successfully &= save_setting('overlay_text', request.form.get('overlay_text', DEFAULT_SETTINGS_DB['overlay_text']))
-            settings_saved_successfully &= save_setting('overlay_position', request.form.get('overlay_position', DEFAULT_SETTINGS_DB['overlay_position']))
-            settings_saved_successfully &= save_setting('overlay_font_size', request.form.get('overlay_font_size', DEFAULT_SETTINGS_DB['overlay_font_size']))
-            settings_saved_successfully &= save_setting('overlay_font_color', request.form.get('overlay_font_color', DEFAULT_SETTINGS_DB['overlay_font_color']))
-            settings_saved_successfully &= save_setting('overlay_logo_enabled', 'overlay_logo_enabled' in request.form)
-            allowed_display_modes = ['text_only', 'logo_only', 'logo_and_text_side', 'logo_and_text_below']
-            display_mode = request.form.get('overlay_display_mode', DEFAULT_SETTINGS_DB['overlay_display_mode'])
-            if display_mode not in allowed_display_modes:
-                display_mode = DEFAULT_SETTINGS_DB['overlay_display_mode']
-            settings_saved_successfully &= save_setting('overlay_display_mode', display_mode)
-            settings_saved_successfully &= save_setting('overlay_background_color', request.form.get('overlay_background_color', DEFAULT_SETTINGS_DB['overlay_background_color']))
-            settings_saved_successfully &= save_setting('overlay_padding', request.form.get('overlay_padding', DEFAULT_SETTINGS_DB['overlay_padding']))
-            # Widget Settings
-            settings_saved_successfully &= save_setting('widgets_time_enabled', 'time_widget_enabled' in request.form)
-            settings_saved_successfully &= save_setting('widgets_weather_enabled', 'weather_widget_enabled' in request.form)
-            settings_saved_successfully &= save_setting('widgets_weather_location', request.form.get('weather_location', DEFAULT_SETTINGS_DB['widgets_weather_location']))
-            settings_saved_successfully &= save_setting('widgets_rss_enabled', 'rss_widget_enabled' in request.form)
-            settings_saved_successfully &= save_setting('widgets_rss_feed_url', request.form.get('rss_feed_url', DEFAULT_SETTINGS_DB['widgets_rss_feed_url']))
-            allowed_speeds = ['slow', 'medium', 'fast']
-            scroll_speed = request.form.get('rss_scroll_speed', DEFAULT_SETTINGS_DB['widgets_rss_scroll_speed'])
-            if scroll_speed not in allowed_speeds:
-                flash(f"Invalid RSS scroll speed '{scroll_speed}'. Defaulting.", "warning")
-                scroll_speed = DEFAULT_SETTINGS_DB['widgets_rss_scroll_speed']
-            settings_saved_successfully &= save_setting('widgets_rss_scroll_speed', scroll_speed)
-            # Burn-in Settings
-            settings_saved_successfully &= save_setting('burn_in_prevention_enabled', 'burn_in_prevention_enabled' in request.form)
-            settings_saved_successfully &= save_setting('burn_in_prevention_elements', request.form.getlist('burn_in_elements'))
-            settings_saved_successfully &= save_setting('burn_in_prevention_interval_seconds', int(request.form.get('burn_in_interval_seconds', DEFAULT_SETTINGS_DB['burn_in_prevention_interval_seconds'])))
-            settings_saved_successfully &= save_setting('burn_in_prevention_strength_pixels', int(request.form.get('burn_in_strength_pixels', DEFAULT_SETTINGS_DB['burn_in_prevention_strength_pixels'])))
+            if not values['slideshow_video_duration_limit_enabled']:
+                values['slideshow_video_random_start_enabled'] = False
+
+            # One query and one commit for the whole form
+            settings_saved_successfully = save_settings(values)
+
+            if invalid_fields:
+                flash(f"Invalid input value provided for {', '.join(invalid_fields)} (must be numbers). "
+                      "Those settings were not changed.", "error")
 
             if settings_saved_successfully:
                 flash("Configuration saved successfully!", "success")
             else:
                 flash("An error occurred while saving some settings. Check logs.", "error")
-        except ValueError:
-            flash("Invalid input value provided (e.g., duration, interval, strength must be numbers).", "error")
         except Exception as e:
             print(f"Error processing save settings request: {e}")
             traceback.print_exc()
@@ -194,48 +229,13 @@ def config_general():
         return redirect(url_for('.config_general'))
 
     # GET Request Logic
-    defaults = DEFAULT_SETTINGS_DB
     # This current_config is for the form values (settings from DB)
-    current_config_values = {
-         "slideshow": {
-             "duration_seconds": get_setting("slideshow_duration_seconds", defaults['slideshow_duration_seconds']),
-             "transition_effect": get_setting("slideshow_transition_effect", defaults['slideshow_transition_effect']),
-             "image_order": get_setting("slideshow_image_order", defaults['slideshow_image_order']),
-             "image_scaling": get_setting("slideshow_image_scaling", defaults['slideshow_image_scaling']),
-             "video_scaling": get_setting("slideshow_video_scaling", defaults['slideshow_video_scaling']),
-             "video_autoplay": get_setting("slideshow_video_autoplay", defaults['slideshow_video_autoplay']),
-             "video_loop": get_setting("slideshow_video_loop", defaults['slideshow_video_loop']),
-             "video_muted": get_setting("slideshow_video_muted", defaults['slideshow_video_muted']),
-             "video_show_controls": get_setting("slideshow_video_show_controls", defaults['slideshow_video_show_controls']),
-         },
-         "overlay": {
-             "enabled": get_setting("overlay_enabled", defaults['overlay_enabled']),
-             "text": get_setting("overlay_text", defaults['overlay_text']),
-             "position": get_setting("overlay_position", defaults['overlay_position']),
-             "font_size": get_setting("overlay_font_size", defaults['overlay_font_size']),
-             "font_color": get_setting("overlay_font_color", defaults['overlay_font_color']),
-             "logo_enabled": get_setting("overlay_logo_enabled", defaults['overlay_logo_enabled']),
-             "display_mode": get_setting("overlay_display_mode", defaults['overlay_display_mode']),
-             "background_color": get_setting("overlay_background_color", defaults['overlay_background_color']),
-             "padding": get_setting("overlay_padding", defaults['overlay_padding']),
-         },
-         "widgets": {
-             "time": {"enabled": get_setting("widgets_time_enabled", defaults['widgets_time_enabled'])},
-             "weather": { "enabled": get_setting("widgets_weather_enabled", defaults['widgets_weather_enabled']), "location": get_setting("widgets_weather_location", defaults['widgets_weather_location']) },
-             "rss": { "enabled": get_setting("widgets_rss_enabled", defaults['widgets_rss_enabled']), "feed_url": get_setting("widgets_rss_feed_url", defaults['widgets_rss_feed_url']), "scroll_speed": get_setting("widgets_rss_scroll_speed", defaults['widgets_rss_scroll_speed']) }
-         },
-         "burn_in_prevention": {
-             "enabled": get_setting("burn_in_prevention_enabled", defaults['burn_in_prevention_enabled']),
-             "elements": get_setting("burn_in_prevention_elements", defaults['burn_in_prevention_elements']),
-             "interval_seconds": get_setting("burn_in_prevention_interval_seconds", defaults['burn_in_prevention_interval_seconds']),
-             "strength_pixels": get_setting("burn_in_prevention_strength_pixels", defaults['burn_in_prevention_strength_pixels'])
-         },
-    }
+    current_config_values = get_nested_settings_view() # Cached per settings snapshot; read-only
 
     # Video Playback Settings (for the separate form that will be moved here)
-    video_duration_limit_enabled = get_setting('slideshow_video_duration_limit_enabled', defaults.get('slideshow_video_duration_limit_enabled', False))
-    video_duration_limit_seconds = get_setting('slideshow_video_duration_limit_seconds', defaults.get('slideshow_video_duration_limit_seconds', 30))
-    video_random_start_enabled = get_setting('slideshow_video_random_start_enabled', defaults.get('slideshow_video_random_start_enabled', False))
+    video_duration_limit_enabled = current_config_values['slideshow']['video_duration_limit_enabled']
+    video_duration_limit_seconds = current_config_values['slideshow']['video_duration_limit_seconds']
+    video_random_start_enabled = current_config_values['slideshow']['video_random_start_enabled']
 
     logo_path = os.path.join(current_app.config['ASSETS_FOLDER'], current_app.config['OVERLAY_LOGO_FILENAME'])
     logo_exists = os.path.isfile(logo_path)
@@ -267,7 +267,11 @@ def upload_overlay_logo():
         save_path = os.path.join(assets_folder, filename)
         try:
             os.makedirs(assets_folder, exist_ok=True)
-            file.save(save_path)
+            # Write beside the target and rename over it, so a slideshow fetching the
+            # logo mid-upload never sees a truncated PNG
+            tmp_path = f"{save_path}.tmp"
+            file.save(tmp_path)
+            os.replace(tmp_path, save_path)
             flash('Overlay logo uploaded successfully!', 'success')
             _touch_config_timestamp()
         except Exception as e:
@@ -295,13 +299,21 @@ def config_media():
             return redirect(url_for('config_bp.config_media'))
 
         # Save settings
-        save_setting('max_resolution', max_resolution)
-        save_setting('convert_to_webp', convert_to_webp)
-        save_setting('webp_quality', webp_quality)
+        save_settings({'max_resolution': max_resolution,
+                       'convert_to_webp': convert_to_webp,
+                       'webp_quality': webp_quality})
 
         flash('Media settings saved successfully', 'success')
         return redirect(url_for('config_bp.config_media'))
 
+    # Revalidate instead of rescanning and re-rendering when nothing has changed.
+    # Pending flash messages are part of the page, so those responses are never validated.
+    etag = get_media_state_etag() if not session.get('_flashes') else None
+    if etag is not None and etag in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
     # Get all media files from database
     all_media, db_uuids = get_database_media()
     
@@ -331,14 +343,18 @@ def config_media():
         'THUMBNAIL_FOLDER': current_app.config['THUMBNAIL_FOLDER']
     }
 
-    return render_template('config_media.html',
+    response = make_response(render_template('config_media.html',
                          config=current_config,
                          media_files=all_media,
                          missing_db_entries=missing_db_entries,
                          orphaned_uuid_files=orphaned_uuid_files,
                          unexpected_files=unexpected_files,
                          unexpected_dirs=unexpected_dirs,
-                         active_page='media')
+                         active_page='media'))
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @config_bp.route('/upload', methods=['POST'])
 @auth.login_required
@@ -364,9 +380,11 @@ def upload_media():
     files = request.files.getlist('media_files')
     uploaded_count = 0
     error_count = 0
-    thumb_error_count = 0
     media_changed = False
     processing_warnings = []
+    # (upload path, thumbnail path, media type, thumbnail reused) for rows staged in the
+    # session; they are all committed together after the loop
+    staged_media = []
 
     if not files or files[0].filename == '':
         flash('No selected file.', 'error')
@@ -387,7 +405,7 @@ def upload_media():
 
             try:
                 # Save the uploaded file
-                file.save(os.path.join(upload_folder, disk_filename))
+                content_hash = save_uploaded_file(file, os.path.join(upload_folder, disk_filename))
 
                 # Process videos
                 if media_type == 'video':
@@ -427,49 +445,32 @@ def upload_media():
                             for warning in warnings
                         ])
 
-                # Generate thumbnail
+                # Reuse the thumbnail of an identical earlier upload; otherwise it is
+                # generated in the background once the batch is committed
                 thumb_disk_filename = f"{uuid_hex}{thumbnail_ext}"
                 thumb_dest_path = os.path.join(
                     thumbnail_folder,
                     thumb_disk_filename
                 )
-                thumb_success, _ = generate_thumbnail(
-                    os.path.join(upload_folder, disk_filename),
-                    thumb_dest_path,
-                    thumbnail_size,
-                    media_type
-                )
+                thumbnail_reused = reuse_existing_thumbnail(content_hash, thumb_dest_path)
 
-                if not thumb_success:
-                    if media_type == 'image':
-                        thumb_error_count += 1
-                        print(
-                            f"Warning: Failed to generate thumbnail "
-                            f"for image {original_filename}"
-                        )
-                    elif media_type == 'video':
-                        print(
-                            f"Info: Failed to generate thumbnail "
-                            f"for video {original_filename}"
-                        )
-
-                # Add to database
+                # Stage in the session; committed once for the whole upload batch
                 display_name_default = os.path.splitext(original_filename)[0]
                 new_media = MediaFile(
                     uuid_filename=uuid_hex,
                     original_filename=original_filename,
                     display_name=display_name_default,
                     extension=file_ext,
-                    media_type=media_type
+                    media_type=media_type,
+                    content_hash=content_hash
                 )
                 db.session.add(new_media)
-                db.session.commit()
+                staged_media.append((os.path.join(upload_folder, disk_filename), thumb_dest_path,
+                                     media_type, thumbnail_reused))
                 uploaded_count += 1
-                media_changed = True
 
             except RequestEntityTooLarge as e:
                 print(f"Upload failed for {original_filename}: {e}")
-                db.session.rollback()
                 if os.path.exists(os.path.join(upload_folder, disk_filename)):
                     try:
                         os.remove(os.path.join(upload_folder, disk_filename))
@@ -483,7 +484,6 @@ def upload_media():
                 traceback.print_exc()
                 flash(f'Error processing file {original_filename}.', 'error')
                 error_count += 1
-                db.session.rollback()
                 if os.path.exists(os.path.join(upload_folder, disk_filename)):
                     try:
                         os.remove(os.path.join(upload_folder, disk_filename))
@@ -495,21 +495,49 @@ def upload_media():
                  'error')
             error_count += 1
 
+    # One transaction (and one SQLite fsync) for the batch instead of one per file. The
+    # staged rows are only flushed here (the duplicate lookup above runs with autoflush
+    # off), so no write lock is held while later files are probed and resized. The
+    # price is that the batch is all-or-nothing: if this commit fails, none of its
+    # files are kept, and the admin is told to upload them again.
+    if staged_media:
+        try:
+            db.session.commit()
+            media_changed = True
+        except Exception as e:
+            print(f"Error committing uploaded media: {e}")
+            traceback.print_exc()
+            db.session.rollback()
+            flash(f"Database error while saving this upload: none of its {uploaded_count} "
+                  "processed file(s) were added. Please upload them again.", 'error')
+            for upload_path, thumb_dest_path, _, _ in staged_media:
+                for path in (upload_path, thumb_dest_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            error_count += uploaded_count
+            uploaded_count = 0
+            staged_media = []
+
+    for upload_path, thumb_dest_path, media_type, thumbnail_reused in staged_media:
+        if not thumbnail_reused:
+            # serve_thumbnail falls back to the placeholder until it has been written
+            submit_thumbnail_job(upload_path, thumb_dest_path, thumbnail_size, media_type)
+
     if media_changed:
+        # One writeback for the whole batch rather than relying on per-file flushes
+        sync_folder(upload_folder)
         _touch_media_timestamp()
 
     if uploaded_count > 0:
-        flash(f'Successfully processed {uploaded_count} media file(s).',
-              'success')
+        flash(f'Successfully processed {uploaded_count} media file(s). '
+              'Thumbnails are generating in the background.', 'success')
 
     if processing_warnings:
         for warning in processing_warnings:
             flash(warning, 'warning')
 
-    if thumb_error_count > 0:
-        flash(f'Failed to generate {thumb_error_count} thumbnails.',
-              'warning')
-
     if error_count > 0:
         flash(f'Failed to process {error_count} file(s).', 'error')
 
@@ -523,22 +551,29 @@ def delete_media():
     deleted_count = 0; error_count = 0; media_changed = False
     if not media_ids_to_delete: flash("No media selected for deletion.", "warning"); return redirect(url_for('.config_media'))
     upload_folder = current_app.config['UPLOAD_FOLDER']; thumbnail_folder = current_app.config['THUMBNAIL_FOLDER']
+    media_ids = set()
     for media_id in media_ids_to_delete:
-        try:
-            media_id_int = int(media_id); media_record = db.session.get(MediaFile, media_id_int)
-            if media_record:
-                disk_filename = media_record.get_disk_filename(); thumbnail_filename = media_record.get_thumbnail_filename(); original_path = os.path.join(upload_folder, disk_filename); thumbnail_path = os.path.join(thumbnail_folder, thumbnail_filename)
-                try:
-                    if os.path.isfile(original_path): os.remove(original_path)
-                    else: print(f"Warning: Original file not found during deletion: {original_path}")
-                    if os.path.isfile(thumbnail_path): os.remove(thumbnail_path)
-                except OSError as e: print(f"Error deleting files for media ID {media_id}: {e}"); flash(f"Error deleting files for '{media_record.display_name}', removing DB record anyway.", "warning")
-                db.session.delete(media_record); deleted_count += 1; media_changed = True
-            else: print(f"Media record not found in DB for ID: {media_id}"); error_count += 1
+        try: media_ids.add(int(media_id))
         except ValueError: print(f"Invalid media ID received: {media_id}"); error_count += 1
-        except Exception as e: print(f"Error processing deletion for media ID {media_id}: {e}"); traceback.print_exc(); error_count += 1; db.session.rollback()
+    # One SELECT for all records and one DELETE ... WHERE id IN (...) instead of a get() and delete() per ID
+    try: media_records = db.session.scalars(db.select(MediaFile).where(MediaFile.id.in_(media_ids))).all() if media_ids else []
+    except Exception as e: print(f"Error loading media records for deletion: {e}"); traceback.print_exc(); db.session.rollback(); media_records = []; error_count += len(media_ids)
+    else:
+        for media_id in sorted(media_ids - {media_record.id for media_record in media_records}): print(f"Media record not found in DB for ID: {media_id}"); error_count += 1
+    for media_record in media_records:
+        original_path = os.path.join(upload_folder, media_record.get_disk_filename()); thumbnail_path = os.path.join(thumbnail_folder, media_record.get_thumbnail_filename())
+        try:
+            # EAFP: one unlink() per file instead of isfile() + remove()
+            try: os.unlink(original_path)
+            except FileNotFoundError: print(f"Warning: Original file not found during deletion: {original_path}")
+            try: os.unlink(thumbnail_path)
+            except FileNotFoundError: pass
+            forget_existing_thumbnails(thumbnail_path)
+        except OSError as e: print(f"Error deleting files for media ID {media_record.id}: {e}"); flash(f"Error deleting files for '{media_record.display_name}', removing DB record anyway.", "warning")
     try:
-        if media_changed: db.session.commit(); _touch_media_timestamp()
+        if media_records:
+            db.session.execute(db.delete(MediaFile).where(MediaFile.id.in_([media_record.id for media_record in media_records])), execution_options={'synchronize_session': False})
+            db.session.commit(); deleted_count = len(media_records); media_changed = True; _touch_media_timestamp()
         else: print("No media records found to delete, skipping commit and timestamp update.")
     except Exception as e: print(f"Error committing deletions to DB: {e}"); traceback.print_exc(); flash("Database error during deletion commit.", "error"); db.session.rollback(); deleted_count = 0; error_count = len(media_ids_to_delete); media_changed=False
     if deleted_count > 0: flash(f"Successfully deleted {deleted_count} media file(s).", "success")
@@ -589,10 +624,14 @@ def update_password():
     if not all([current_password, new_password, confirm_password]): flash("All fields are required.", "error"); return redirect(redirect_url)
     if new_password != confirm_password: flash("New password and confirmation do not match.", "error"); return redirect(redirect_url)
     stored_password_hash = get_setting('auth_password_hash')
-    if not stored_password_hash or not check_password_hash(stored_password_hash, current_password): flash("Incorrect current password.", "error"); return redirect(redirect_url)
-    if check_password_hash(stored_password_hash, new_password): flash("New password cannot be the same.", "error"); return redirect(redirect_url)
+    # The admin's browser is already sending this password, so the check is usually a cache hit
+    try: password_ok = bool(stored_password_hash) and check_password_cached(stored_password_hash, current_password, request.remote_addr)
+    except LoginThrottled as e: flash(f"Too many incorrect attempts. Try again in {e.retry_after} seconds.", "error"); return redirect(redirect_url)
+    if not password_ok: flash("Incorrect current password.", "error"); return redirect(redirect_url)
+    # current_password is verified, so a plaintext comparison stands in for a second KDF run
+    if new_password == current_password: flash("New password cannot be the same.", "error"); return redirect(redirect_url)
     try:
-        new_hash = generate_password_hash(new_password)
+        new_hash = hash_password(new_password)
         if save_setting('auth_password_hash', new_hash): flash("Password updated successfully!", "success")
         else: flash("Error saving updated password.", "error")
     except Exception as e: print(f"Error processing password update: {e}"); traceback.print_exc(); flash("An unexpected error occurred.", "error")
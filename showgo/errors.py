@@ -3,7 +3,7 @@
 
 import traceback
 from flask import render_template, jsonify, flash, redirect, url_for, current_app
-from werkzeug.exceptions import NotFound, InternalServerError, RequestEntityTooLarge
+from werkzeug.exceptions import NotFound, InternalServerError, RequestEntityTooLarge, TooManyRequests
 from sqlalchemy.exc import OperationalError # Import if needed for specific DB errors
 from .extensions import db # Import db instance if needed for rollback
 
@@ -47,3 +47,7 @@ def request_entity_too_large(error):
     # Redirect back to the media config page
     return redirect(url_for('config_bp.config_media'))
 
+def too_many_requests(error):
+    """Returns the throttled-login response, keeping its Retry-After header."""
+    print(f"429 Error: {error}")
+    return error.get_response()
@@ -1,9 +1,49 @@
 # showgo/extensions.py
 # Initialize Flask extensions here to avoid circular imports
 
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_httpauth import HTTPBasicAuth
+from .config import ORJSON_AVAILABLE
+
+if ORJSON_AVAILABLE:
+    import orjson
 
 db = SQLAlchemy()
 auth = HTTPBasicAuth(realm="ShowGo Configuration Access")
 
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (jsonify, request.get_json, the tojson filter).
+
+    Calls using options orjson has no equivalent for fall back to the stdlib provider.
+    Datetimes and dataclasses are passed through to Flask's default() so they serialize
+    exactly as before.
+    """
+    _BASE_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                     | orjson.OPT_PASSTHROUGH_DATACLASS) if ORJSON_AVAILABLE else 0
+
+    def dumps(self, obj, **kwargs):
+        option = self._BASE_OPTIONS
+        if kwargs.pop("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        indent = kwargs.pop("indent", None)
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get("separators") == (",", ":"):
+            kwargs.pop("separators") # orjson output is always compact
+        if (indent not in (None, 2)) or kwargs:
+            if indent is not None:
+                kwargs["indent"] = indent
+            return super().dumps(obj, sort_keys=bool(option & orjson.OPT_SORT_KEYS), **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+        except TypeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles them
+            return super().dumps(obj, sort_keys=bool(option & orjson.OPT_SORT_KEYS),
+                                 **({"indent": indent} if indent is not None else {}))
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
@@ -62,8 +62,16 @@ def resize_image(image_path, max_resolution, output_path=None):
                 resized.save(output_path, quality=95, optimize=True)
                 return True, (width, height)
             else:
-                img.thumbnail((width, height), Image.Resampling.LANCZOS)
-                img.save(image_path, quality=95, optimize=True)
+                # Replace the original atomically so it is never served half-written
+                root, ext = os.path.splitext(image_path)
+                tmp_path = f"{root}.tmp{ext}"
+                try:
+                    resized.save(tmp_path, img.format, quality=95, optimize=True)
+                    os.replace(tmp_path, image_path)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
                 return True, (width, height)
 
     except Exception as e:
@@ -157,10 +165,9 @@ def process_image(image_path, max_resolution=None, convert_webp=None):
     if convert_webp:
         success, webp_path = convert_to_webp(image_path)
         if success:
-            # If conversion successful, replace original with WebP version
+            # If conversion successful, replace original with WebP version (atomic rename)
             try:
-                os.remove(image_path)
-                os.rename(webp_path, image_path)
+                os.replace(webp_path, image_path)
                 warnings.append("Image converted to WebP format")
             except OSError as e:
                 err = "Failed to replace original with WebP version"
@@ -2,84 +2,121 @@
 # Blueprint for core slideshow viewer and related routes/API
 
 import os
-import random
-import requests
-import feedparser
-import traceback
+import hashlib
+import mimetypes
+from urllib.parse import quote
+from werkzeug.exceptions import NotFound
 from flask import (Blueprint, render_template, current_app, send_from_directory,
-                   jsonify, make_response, url_for) # *** ADDED url_for ***
+                   jsonify, make_response, url_for, abort, request) # *** ADDED url_for ***
+from werkzeug.security import safe_join
+from jinja2.utils import htmlsafe_json_dumps
 from .extensions import db
 from .models import MediaFile, Setting
-from .utils import get_setting, get_config_timestamp_from_db, get_database_media, load_settings_from_db
+from .utils import (get_setting, get_config_timestamp_from_db, get_database_media,
+                    build_nested_settings, get_settings_version,
+                    copy_settings, get_upload_filenames, get_settings_view,
+                    get_media_state_etag, is_existing_thumbnail,
+                    remember_existing_thumbnail, forget_existing_thumbnails)
+from .widgets import get_widget_data
 from .config import DEFAULT_SETTINGS_DB # Import defaults
 
 # Create Blueprint
 main_bp = Blueprint('main_bp', __name__)
 
+# --- Helpers ---
+
+def _send_media_file(folder, url_folder, filename):
+    """Sends a file from folder, handing the transfer to nginx when X-Accel-Redirect is configured."""
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        if safe_join(folder, filename) is None:
+            abort(404)
+        # nginx keeps the upstream Content-Type on internal redirects, so send the file's
+        # own type rather than the empty body's text/html
+        response = make_response('')
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response.headers['X-Accel-Redirect'] = quote(f"{accel_prefix.rstrip('/')}/{url_folder}/{filename}")
+        return response
+    # With USE_X_SENDFILE enabled, send_from_directory emits X-Sendfile instead of the body
+    return make_response(send_from_directory(folder, filename))
+
+# Serialized slideshow config, keyed on (settings version, logo URL) so it is only
+# re-encoded after a settings save or logo upload rather than on every page load
+_config_json_cache = {}
+
+def _tojson(obj):
+    """Encodes obj exactly as the template 'tojson' filter would."""
+    policies = current_app.jinja_env.policies
+    return htmlsafe_json_dumps(obj, dumps=policies['json.dumps_function'],
+                               **policies['json.dumps_kwargs'])
+
+def _get_config_json(full_config, settings_version):
+    """Returns full_config encoded as the template 'tojson' filter would, cached per settings version."""
+    def encode():
+        return _tojson(full_config)
+    if settings_version is None:
+        return encode()
+    cache_key = (settings_version, full_config["overlay"]["logo_url"])
+    config_json = _config_json_cache.get(cache_key)
+    if config_json is None:
+        _config_json_cache.clear() # Only the current version is ever needed
+        config_json = _config_json_cache[cache_key] = encode()
+    return config_json
+
+# Validated slideshow media list, keyed on the settings/database version and the upload
+# folder listing. Any media commit changes the database mtime and any upload/delete
+# replaces the cached listing, so the list is rebuilt only after a real change.
+_slideshow_media_cache = {}
+
+def _get_slideshow_media(settings_version):
+    """Returns (media_list, media_json) for media whose files exist, in database order.
+
+    media_list holds {'filename', 'type'} dicts and is shared; don't mutate it. media_json
+    is the same list pre-encoded for the template.
+    """
+    upload_files = get_upload_filenames() # One cached folder listing instead of a stat per file
+    cached = _slideshow_media_cache.get('media')
+    if (settings_version is not None and upload_files is not None and cached is not None
+            and cached[0] == settings_version and cached[1] is upload_files):
+        return cached[2], cached[3]
+    all_db_media, _ = get_database_media()
+    valid_media_list = []
+    for media in all_db_media:
+        disk_filename = media.get_disk_filename()
+        if upload_files is not None:
+            file_exists = disk_filename in upload_files
+        else:
+            file_exists = media.check_files_exist()
+        if file_exists:
+            valid_media_list.append({
+                'filename': disk_filename,
+                'type': media.media_type
+            })
+        else:
+            current_app.logger.debug("Slideshow: Skipping media ID %s ('%s') due to missing file(s).", media.id, media.display_name)
+    media_json = _tojson(valid_media_list)
+    if settings_version is not None and upload_files is not None:
+        _slideshow_media_cache['media'] = (settings_version, upload_files, valid_media_list, media_json)
+    return valid_media_list, media_json
+
 # --- Routes ---
 
 @main_bp.route('/')
 def slideshow_viewer():
     """ Route for the main slideshow display page. """
     # current_config_dict holds settings values from the database
-    current_config_dict = load_settings_from_db()
+    settings_version = get_settings_version()
+    current_config_dict = get_settings_view() # Read-only; build_nested_settings copies what it needs
     if current_config_dict is None: # Should not happen if initialize_database works
-         print("CRITICAL ERROR: load_settings_from_db returned None unexpectedly. Using hardcoded defaults.")
-         current_config_dict = DEFAULT_SETTINGS_DB.copy()
+         print("CRITICAL ERROR: get_settings_view returned None unexpectedly. Using hardcoded defaults.")
+         current_config_dict = copy_settings(DEFAULT_SETTINGS_DB)
 
     config_timestamp = get_config_timestamp_from_db()
 
-    # Use DEFAULT_SETTINGS_DB as the ultimate fallback for each key
-    defaults = DEFAULT_SETTINGS_DB
-
     # Construct the full_config object to pass to the template.
     # This ensures all expected keys are present, using DB values or defaults.
-    full_config = {
-        "slideshow": {
-            "duration_seconds": current_config_dict.get("slideshow_duration_seconds", defaults['slideshow_duration_seconds']),
-            "transition_effect": current_config_dict.get("slideshow_transition_effect", defaults['slideshow_transition_effect']),
-            "image_order": current_config_dict.get("slideshow_image_order", defaults['slideshow_image_order']),
-            "image_scaling": current_config_dict.get("slideshow_image_scaling", defaults['slideshow_image_scaling']),
-            "video_scaling": current_config_dict.get("slideshow_video_scaling", defaults['slideshow_video_scaling']),
-            "video_autoplay": current_config_dict.get("slideshow_video_autoplay", defaults['slideshow_video_autoplay']),
-            "video_loop": current_config_dict.get("slideshow_video_loop", defaults['slideshow_video_loop']),
-            "video_muted": current_config_dict.get("slideshow_video_muted", defaults['slideshow_video_muted']),
-            "video_show_controls": current_config_dict.get("slideshow_video_show_controls", defaults['slideshow_video_show_controls']),
-            "video_duration_limit_enabled": current_config_dict.get("slideshow_video_duration_limit_enabled", defaults['slideshow_video_duration_limit_enabled']),
-            "video_duration_limit_seconds": current_config_dict.get("slideshow_video_duration_limit_seconds", defaults['slideshow_video_duration_limit_seconds']),
-            "video_random_start_enabled": current_config_dict.get("slideshow_video_random_start_enabled", defaults['slideshow_video_random_start_enabled']),
-        },
-        "overlay": { # Changed from "watermark"
-            "enabled": current_config_dict.get("overlay_enabled", defaults['overlay_enabled']),
-            "text": current_config_dict.get("overlay_text", defaults['overlay_text']),
-            "position": current_config_dict.get("overlay_position", defaults['overlay_position']),
-            "font_size": current_config_dict.get("overlay_font_size", defaults['overlay_font_size']),
-            "font_color": current_config_dict.get("overlay_font_color", defaults['overlay_font_color']),
-            "logo_enabled": current_config_dict.get("overlay_logo_enabled", defaults['overlay_logo_enabled']),
-            "display_mode": current_config_dict.get("overlay_display_mode", defaults['overlay_display_mode']),
-            "background_color": current_config_dict.get("overlay_background_color", defaults['overlay_background_color']),
-            "padding": current_config_dict.get("overlay_padding", defaults['overlay_padding']),
-            "logo_url": None # Default to None, will be set if logo exists
-        },
-        "widgets": {
-            "time": {"enabled": current_config_dict.get("widgets_time_enabled", defaults['widgets_time_enabled'])},
-            "weather": {
-                "enabled": current_config_dict.get("widgets_weather_enabled", defaults['widgets_weather_enabled']),
-                "location": current_config_dict.get("widgets_weather_location", defaults['widgets_weather_location'])
-            },
-            "rss": {
-                "enabled": current_config_dict.get("widgets_rss_enabled", defaults['widgets_rss_enabled']),
-                "feed_url": current_config_dict.get("widgets_rss_feed_url", defaults['widgets_rss_feed_url']),
-                "scroll_speed": current_config_dict.get("widgets_rss_scroll_speed", defaults['widgets_rss_scroll_speed'])
-            }
-        },
-        "burn_in_prevention": {
-            "enabled": current_config_dict.get("burn_in_prevention_enabled", defaults['burn_in_prevention_enabled']),
-            "elements": current_config_dict.get("burn_in_prevention_elements", defaults['burn_in_prevention_elements']),
-            "interval_seconds": current_config_dict.get("burn_in_prevention_interval_seconds", defaults['burn_in_prevention_interval_seconds']),
-            "strength_pixels": current_config_dict.get("burn_in_prevention_strength_pixels", defaults['burn_in_prevention_strength_pixels'])
-        },
-    }
+    full_config = build_nested_settings(current_config_dict)
+    full_config["overlay"]["logo_url"] = None # Default to None, will be set if logo exists
 
     # Check if overlay logo exists and set its URL
     if full_config["overlay"]["logo_enabled"]:
@@ -98,132 +135,142 @@ def slideshow_viewer():
             except OSError:
                 pass # If mtime fails, use URL without version
         else:
-            print(f"Overlay logo enabled in settings, but '{logo_filename}' not found in '{assets_folder}'. Disabling logo for this view.")
+            current_app.logger.debug("Overlay logo enabled in settings, but '%s' not found in '%s'. Disabling logo for this view.", logo_filename, assets_folder)
             full_config["overlay"]["logo_enabled"] = False # Effectively disable if file not found
 
-    # Get Validated Media List
-    all_db_media, _ = get_database_media()
-    valid_media_list = []
-    for media in all_db_media:
-        if media.check_files_exist():
-            valid_media_list.append({
-                'filename': media.get_disk_filename(),
-                'type': media.media_type
-            })
-        else:
-            print(f"Slideshow: Skipping media ID {media.id} ('{media.display_name}') due to missing file(s).")
+    # Get Validated Media List (cached). Random order is applied by slideshow.js, so the
+    # page stays identical between library changes and the list is never re-encoded.
+    valid_media_list, media_json = _get_slideshow_media(settings_version)
 
     if not valid_media_list:
-        print("Warning: No valid media files found for slideshow.")
-    if full_config['slideshow']['image_order'] == 'random':
-        random.shuffle(valid_media_list)
+        current_app.logger.debug("No valid media files found for slideshow.")
 
-    # Fetch Weather / RSS
+    # Weather / RSS come from the in-memory widget cache (see widgets.py); only the first
+    # request for a location/feed waits on the network, and both are fetched concurrently
     weather_data = None
     weather_error = None
     rss_data = None
     rss_error = None
+    widget_lookups = {}
     weather_widget_config = full_config.get('widgets', {}).get('weather', {})
     openweathermap_api_key = os.environ.get('OPENWEATHERMAP_API_KEY')
     if weather_widget_config.get('enabled'):
         location = weather_widget_config.get('location')
         if location and openweathermap_api_key:
-            try:
-                weather_url = f"https://api.openweathermap.org/data/2.5/weather?q={location}&appid={openweathermap_api_key}&units=imperial"
-                response = requests.get(weather_url, timeout=10)
-                response.raise_for_status()
-                weather_data = response.json()
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching weather data: {e}")
-                weather_error = f"Network/API Error: {e}"
-            except Exception as e:
-                print(f"Unexpected error processing weather data: {e}")
-                traceback.print_exc()
-                weather_error = f"Processing Error: {e}"
+            widget_lookups['weather'] = ('weather', location, openweathermap_api_key)
         elif not openweathermap_api_key:
-             print("Weather widget enabled, but OPENWEATHERMAP_API_KEY environment variable is not set.")
+             current_app.logger.debug("Weather widget enabled, but OPENWEATHERMAP_API_KEY environment variable is not set.")
              weather_error = "API Key Missing"
         elif not location:
-             print("Weather widget enabled, but no location is set.")
+             current_app.logger.debug("Weather widget enabled, but no location is set.")
              weather_error = "Location Missing"
 
     rss_widget_config = full_config.get('widgets', {}).get('rss', {})
     if rss_widget_config.get('enabled'):
         feed_url = rss_widget_config.get('feed_url')
         if feed_url:
-            try:
-                headers = {'User-Agent': f"ShowGo/{current_app.config.get('VERSION', '1.0')}"}
-                rss_data_raw = feedparser.parse(feed_url, agent=headers['User-Agent'])
-                if rss_data_raw.bozo:
-                    bozo_exception_msg = str(rss_data_raw.bozo_exception) if hasattr(rss_data_raw, 'bozo_exception') else "Unknown parsing issue"
-                    print(f"Error parsing RSS feed (bozo): {feed_url} - {bozo_exception_msg}")
-                    rss_error = f"Feed Parsing Error: {bozo_exception_msg}"
-                elif rss_data_raw.entries:
-                    rss_data = [{'title': entry.get('title', 'No Title'), 'link': entry.get('link', '#')} for entry in rss_data_raw.entries[:15]]
-                else:
-                    print(f"RSS feed parsed but no entries found: {feed_url}")
-                    rss_error = "Feed Empty"
-            except Exception as e:
-                print(f"Error fetching or parsing RSS feed: {e}")
-                traceback.print_exc()
-                rss_error = f"Fetch/Parse Error: {e}"
+            user_agent = f"ShowGo/{current_app.config.get('VERSION', '1.0')}"
+            widget_lookups['rss'] = ('rss', feed_url, user_agent)
         else:
-            print("RSS widget enabled, but no feed URL is set.")
+            current_app.logger.debug("RSS widget enabled, but no feed URL is set.")
             rss_error = "Feed URL Missing"
 
-    return render_template('slideshow.html',
-                           config=full_config, # Pass the fully constructed config
-                           media_items=valid_media_list,
-                           weather=weather_data,
-                           weather_error=weather_error,
-                           rss_headlines=rss_data,
-                           rss_error=rss_error,
-                           initial_config_timestamp=config_timestamp)
+    if widget_lookups:
+        refresh_seconds = current_app.config.get('WIDGET_REFRESH_SECONDS', 300)
+        widget_results = get_widget_data(refresh_seconds, widget_lookups)
+        if 'weather' in widget_results:
+            weather_data, weather_error = widget_results['weather']
+        if 'rss' in widget_results:
+            rss_data, rss_error = widget_results['rss']
+
+    # The page is identical until the database, media folders, logo or widget data change
+    # (random order is applied client-side), so reloads can be answered with a 304
+    etag = get_media_state_etag()
+    if etag is not None:
+        etag = hashlib.md5(repr((etag, full_config["overlay"]["logo_url"], weather_data, weather_error,
+                                 rss_data, rss_error)).encode()).hexdigest()
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+    response = make_response(render_template('slideshow.html',
+                                           config=full_config, # Pass the fully constructed config
+                                           config_json=_get_config_json(full_config, settings_version),
+                                           media_items=valid_media_list,
+                                           media_items_json=media_json,
+                                           weather=weather_data,
+                                           weather_error=weather_error,
+                                           rss_headlines=rss_data,
+                                           rss_error=rss_error,
+                                           initial_config_timestamp=config_timestamp))
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @main_bp.route('/uploads/<path:filename>')
 def serve_uploaded_media(filename):
     """Serves original uploaded media files (images and videos) with caching."""
     upload_folder = current_app.config['UPLOAD_FOLDER']
-    response = make_response(send_from_directory(upload_folder, filename))
+    response = _send_media_file(upload_folder, 'uploads', filename)
     response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
     return response
 
 
+def _placeholder_thumbnail():
+    """Returns the placeholder thumbnail response, or a plain 404 if it is missing."""
+    if current_app.config['PLACEHOLDER_THUMB_EXISTS']:
+        static_folder_images = os.path.join(current_app.static_folder, 'images')
+        resp_placeholder = make_response(send_from_directory(static_folder_images, 'placeholder_thumb.png'))
+        # Don't let browsers hold on to the placeholder; the real thumbnail
+        # may still be rendering in the background.
+        resp_placeholder.headers['Cache-Control'] = 'no-cache'
+        return resp_placeholder
+    print("Placeholder thumbnail image not found!")
+    return "Not Found", 404
+
 @main_bp.route('/thumbnails/<path:filename>')
 def serve_thumbnail(filename):
     """Serves thumbnail images, providing a placeholder if not found, with caching."""
     thumbnail_folder = current_app.config['THUMBNAIL_FOLDER']
-    static_folder_images = os.path.join(current_app.static_folder, 'images')
-    requested_path = os.path.join(thumbnail_folder, filename)
-    safe_path = os.path.abspath(requested_path)
+    # safe_join rejects traversal with string checks alone (no getcwd/abspath per request)
+    safe_path = safe_join(thumbnail_folder, filename)
 
-    if not safe_path.startswith(os.path.abspath(thumbnail_folder)):
+    if safe_path is None:
         print(f"Forbidden access attempt for thumbnail: {filename}")
         return "Forbidden", 403
 
-    if not os.path.isfile(safe_path):
-        print(f"Thumbnail not found: {filename}. Serving placeholder.")
-        placeholder = os.path.join(static_folder_images, 'placeholder_thumb.png')
-        if os.path.isfile(placeholder):
-            resp_placeholder = make_response(send_from_directory(static_folder_images, 'placeholder_thumb.png'))
-            resp_placeholder.headers['Cache-Control'] = 'public, max-age=3600'
-            return resp_placeholder
-        else:
-            print("Placeholder thumbnail image not found!")
-            return "Not Found", 404
+    if not is_existing_thumbnail(safe_path):
+        if not os.path.isfile(safe_path):
+            current_app.logger.debug("Thumbnail not found: %s. Serving placeholder.", filename)
+            return _placeholder_thumbnail()
+        remember_existing_thumbnail(safe_path)
 
-    response = make_response(send_from_directory(thumbnail_folder, filename))
-    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    try:
+        response = _send_media_file(thumbnail_folder, 'thumbnails', filename)
+    except NotFound:
+        # Remembered, but deleted since (e.g. by another worker's cleanup)
+        forget_existing_thumbnails(safe_path)
+        return _placeholder_thumbnail()
+    # Not immutable: `flask db regenerate-thumbnails --all` rewrites thumbnails under the
+    # same name. Browsers revalidate against the ETag/Last-Modified and usually get a 304.
+    response.headers['Cache-Control'] = 'public, no-cache'
     return response
 
 
 @main_bp.route('/api/config/check')
 def check_config():
     """API endpoint for the client to check for configuration updates."""
+    # jsonify encodes through app.json, which is orjson-backed when available (see create_app)
     timestamp = get_config_timestamp_from_db()
     if timestamp is None:
          print("Error: check_config failed because get_config_timestamp_from_db returned None.")
-         return jsonify({'error': 'Could not retrieve configuration status from server.', 'timestamp': 0}), 500
+         response = jsonify({'error': 'Could not retrieve configuration status from server.', 'timestamp': 0})
+         response.status_code = 500
     else:
-         return jsonify({'timestamp': timestamp})
+         response = jsonify({'timestamp': timestamp})
+    # Polled status; proxies and browsers must not reuse an old answer
+    response.headers['Cache-Control'] = 'no-store'
+    return response
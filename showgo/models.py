@@ -10,6 +10,9 @@ class Setting(db.Model):
     __tablename__ = 'settings'
     key = db.Column(db.String(100), primary_key=True)
     value = db.Column(db.JSON)
+    # Bumped on every insert/update; get_config_timestamp_from_db reads MAX() of it
+    last_updated = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                             onupdate=lambda: datetime.now(timezone.utc), index=True)
 
     def __init__(self, key=None, value=None):
         self.key = key
@@ -31,6 +34,8 @@ class MediaFile(db.Model):
     uploaded_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     # *** ADDED media_type field ***
     media_type = db.Column(db.String(10), nullable=False, default='image') # Stores 'image' or 'video'
+    # Digest of the uploaded bytes; identical re-uploads reuse the existing thumbnail
+    content_hash = db.Column(db.String(64), index=True)
 
     def get_disk_filename(self):
         """Returns the full filename used on disk (uuid + extension)."""
@@ -30,6 +30,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const mediaItems = slideshowData.mediaItems || [];
     const config = slideshowData.config || {}; // Full config object from Flask
     const slideshowConfig = config.slideshow || {};
+
+    // Random order is applied here (Fisher-Yates) so the server can send a cached list
+    if (slideshowConfig.image_order === 'random') {
+        for (let i = mediaItems.length - 1; i > 0; i--) {
+            const j = Math.floor(Math.random() * (i + 1));
+            [mediaItems[i], mediaItems[j]] = [mediaItems[j], mediaItems[i]];
+        }
+    }
     const overlayConfig = config.overlay || {}; // Overlay specific settings
     const widgetConfig = config.widgets || {};
     const burnInConfig = config.burn_in_prevention || {};
@@ -2,20 +2,30 @@
 # Helper functions for the ShowGo application
 
 import os
+import re
+import sys
 import shutil
+import time
+import hashlib
 import traceback
-import json # For parsing ffprobe output
+import threading
+import tempfile
+import json # For parsing ffprobe output (fallback when orjson is missing)
 import subprocess # For running ffmpeg/ffprobe
+from collections import deque, ChainMap
+from concurrent.futures import ThreadPoolExecutor # For background thumbnail generation
 from datetime import datetime, timezone
-from flask import current_app, flash
+from functools import lru_cache
+from flask import current_app, flash, Request
+from werkzeug.security import check_password_hash, generate_password_hash
 # Import specific exceptions for more targeted handling if needed
 from sqlalchemy.exc import ProgrammingError, OperationalError, IntegrityError
-from sqlalchemy import func # Import func for max()
+from sqlalchemy import func, text # Import func for max(), text for schema top-ups
 
 # Import db and models carefully
 from .extensions import db
 from .models import Setting # Keep Setting import
-from .config import DEFAULT_SETTINGS_DB # Import defaults for fallback
+from .config import DEFAULT_SETTINGS_DB, DEFAULT_PASSWORD, SETTINGS_LAYOUT, ORJSON_AVAILABLE, PASSWORD_HASH_METHOD # Import defaults for fallback
 
 # --- Pillow Check ---
 try:
@@ -27,15 +37,33 @@ except ImportError:
     class UnidentifiedImageError(Exception): pass
     class Image: pass
 
+# --- JSON Decoding ---
+# ffprobe output is parsed with orjson when it is installed (see config.py). Its
+# JSONDecodeError subclasses json.JSONDecodeError, so the existing handlers still apply.
+if ORJSON_AVAILABLE:
+    import orjson
+    _json_loads = orjson.loads
+else:
+    _json_loads = json.loads
+
+# --- Optional pyvips Check ---
+# libvips fuses open+resize with shrink-on-load and never holds the full decoded
+# bitmap, so when it is installed image thumbnails are produced with it.
+try:
+    import pyvips
+    VIPS_AVAILABLE = True
+except (ImportError, OSError): # OSError: binding present but libvips shared library missing
+    VIPS_AVAILABLE = False
+
 # --- File Handling Helpers ---
 # (get_media_type, allowed_file, _get_video_duration, generate_thumbnail, is_web_friendly_video remain the same)
 def get_media_type(filename):
     """Determines if a file is an image or video based on its extension."""
-    if not filename or '.' not in filename:
+    if not filename:
         return None
-    ext = filename.rsplit('.', 1)[1].lower()
-    image_exts = current_app.config.get('ALLOWED_IMAGE_EXTENSIONS', set()) if current_app else set()
-    video_exts = current_app.config.get('ALLOWED_VIDEO_EXTENSIONS', set()) if current_app else set()
+    ext = os.path.splitext(filename)[1][1:].lower()
+    image_exts = current_app.config.get('ALLOWED_IMAGE_EXTENSIONS', frozenset()) if current_app else frozenset()
+    video_exts = current_app.config.get('ALLOWED_VIDEO_EXTENSIONS', frozenset()) if current_app else frozenset()
     if ext in image_exts:
         return 'image'
     elif ext in video_exts:
@@ -45,8 +73,135 @@ def get_media_type(filename):
 
 def allowed_file(filename):
     """Checks if the filename has an allowed image or video extension."""
-    allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', set()) if current_app else set()
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
+    allowed_suffixes = current_app.config.get('ALLOWED_SUFFIXES', ()) if current_app else ()
+    # A single C-level suffix match; no split or slice allocations
+    return filename.lower().endswith(allowed_suffixes)
+
+class UploadRequest(Request):
+    """Request that spools larger multipart file parts to UPLOAD_TMP_FOLDER.
+
+    Werkzeug's default spools them to the system temp dir (often tmpfs, i.e. RAM), after
+    which save_uploaded_file copies them again. A named temp file beside the data folders
+    can instead be hard-linked into place.
+    """
+    _IN_MEMORY_MAX = 500 * 1024 # Werkzeug's own in-memory threshold
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        tmp_folder = current_app.config.get('UPLOAD_TMP_FOLDER') if current_app else None
+        if not tmp_folder or (total_content_length is not None and total_content_length <= self._IN_MEMORY_MAX):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        # Deleted when Werkzeug closes the request's files; a link made by then survives
+        return tempfile.NamedTemporaryFile('wb+', dir=tmp_folder, prefix='upload-')
+
+# NamedTemporaryFile creates spool files as 0600; linked uploads get the mode a regular
+# open() would have given them so a web server can serve them directly. The umask is
+# read once here, as os.umask() can only be queried by setting it (not thread-safe).
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_UPLOAD_FILE_MODE = 0o666 & ~_UMASK
+
+def _link_spooled_upload(stream, dest_path):
+    """Hard-links an UploadRequest temp file to dest_path. Returns False if it can't be linked."""
+    tmp_name = getattr(stream, 'name', None)
+    if not isinstance(tmp_name, str):
+        return False # In-memory or anonymous temp file
+    try:
+        stream.flush()
+        os.fchmod(stream.fileno(), _UPLOAD_FILE_MODE)
+        os.link(tmp_name, dest_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        return False # e.g. different filesystem; copy instead
+    return True
+
+def save_uploaded_file(file_storage, dest_path):
+    """Streams an uploaded file to disk using a large copy buffer (fewer syscalls per MB).
+
+    Uploads spooled by UploadRequest are hard-linked into place instead of copied.
+    The destination is created with O_EXCL ('xb' / link), so an existing file is never
+    overwritten and no exists()-then-open() check is needed; raises FileExistsError.
+    Returns a BLAKE2b hex digest of the content, computed in the same pass as the copy.
+    """
+    buffer_size = current_app.config.get('UPLOAD_BUFFER_SIZE', 256 * 1024) if current_app else 256 * 1024
+    digest = hashlib.blake2b(digest_size=16)
+    stream = file_storage.stream
+    read = stream.read
+    if _link_spooled_upload(stream, dest_path):
+        stream.seek(0)
+        while True:
+            chunk = read(buffer_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+        return digest.hexdigest()
+    with open(dest_path, 'xb', buffering=buffer_size) as dst:
+        while True:
+            chunk = read(buffer_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+def reuse_existing_thumbnail(content_hash, dest_path):
+    """Links (or copies) the thumbnail of an earlier upload with the same content to dest_path.
+
+    Returns True if a thumbnail was reused, False if one still needs to be generated.
+    """
+    if not content_hash:
+        return False
+    from .models import MediaFile # Import locally
+    try:
+        # Don't autoflush rows the caller has staged: on SQLite the INSERT would open
+        # the write transaction now and hold it through the rest of an upload batch
+        with db.session.no_autoflush:
+            candidates = MediaFile.query.filter_by(content_hash=content_hash).all()
+    except Exception as e:
+        print(f"Error looking up duplicate media for thumbnail reuse: {e}")
+        return False
+    for media in candidates:
+        source_path = media.get_thumbnail_path()
+        try:
+            os.link(source_path, dest_path)
+        except FileNotFoundError:
+            continue # Thumbnail missing or still being generated
+        except OSError:
+            try:
+                shutil.copyfile(source_path, dest_path)
+            except OSError:
+                continue
+        current_app.logger.debug("Reused thumbnail of media ID %s for identical upload.", media.id)
+        return True
+    return False
+
+def _load_syncfs():
+    """Returns libc's syncfs() on Linux, or None where it isn't available."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        return libc.syncfs
+    except (OSError, AttributeError):
+        return None
+
+_syncfs = _load_syncfs()
+
+def sync_folder(folder):
+    """Flushes the filesystem holding `folder` once, instead of fsyncing each file written."""
+    try:
+        if _syncfs is not None:
+            fd = os.open(folder, os.O_RDONLY)
+            try:
+                if _syncfs(fd) != 0:
+                    print(f"Warning: syncfs failed for {folder}")
+            finally:
+                os.close(fd)
+        elif hasattr(os, 'sync'):
+            os.sync()
+    except OSError as e:
+        print(f"Warning: Could not sync folder {folder}: {e}")
 
 def _get_video_duration(source_path):
     """Uses ffprobe to get the duration of a video file in seconds."""
@@ -56,7 +211,7 @@ def _get_video_duration(source_path):
     command = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', source_path]
     try:
         process = subprocess.run(command, capture_output=True, text=True, check=True, timeout=10)
-        data = json.loads(process.stdout)
+        data = _json_loads(process.stdout)
         duration = float(data['format']['duration'])
         return duration
     except FileNotFoundError:
@@ -76,10 +231,38 @@ def _get_video_duration(source_path):
         traceback.print_exc()
         return None
 
+def _generate_image_thumbnail_vips(source_path, dest_path, size):
+    """Thumbnails an image with pyvips. Returns False so the caller can fall back to Pillow.
+
+    Any failure (pyvips.Error, or OSError/TypeError etc. from the bindings) is reported
+    and a partially written dest_path is removed.
+    """
+    try:
+        # size='down' never upscales, matching Image.thumbnail; animated GIFs load page 0 only
+        thumb = pyvips.Image.thumbnail(source_path, size[0], height=size[1], size='down')
+        thumb.write_to_file(dest_path)
+        return True
+    except Exception as e:
+        print(f"pyvips could not thumbnail {os.path.basename(source_path)}, falling back to Pillow: {e}")
+        _discard_file(dest_path)
+        return False
+
+def _discard_file(path):
+    """Removes a leftover temporary file, ignoring errors."""
+    try: os.remove(path)
+    except OSError: pass
+
 def generate_thumbnail(source_path, dest_path, size, media_type='image'):
-    """Generates a thumbnail for an image (Pillow) or video (ffmpeg)."""
+    """Generates a thumbnail for an image (Pillow) or video (ffmpeg).
+
+    The thumbnail is written to a sibling temp file and renamed into place, so
+    serve_thumbnail never sends a partially written file.
+    """
     dest_dir = os.path.dirname(dest_path)
     os.makedirs(dest_dir, exist_ok=True)
+    # Keep the real extension last: ffmpeg and libvips pick the output format from it
+    dest_root, dest_ext = os.path.splitext(dest_path)
+    tmp_path = f"{dest_root}.tmp{dest_ext}"
     if media_type == 'video':
         if not shutil.which("ffmpeg"):
             print("ERROR: ffmpeg command not found. Cannot generate video thumbnail.")
@@ -93,11 +276,12 @@ def generate_thumbnail(source_path, dest_path, size, media_type='image'):
         ffmpeg_command = [
             'ffmpeg', '-ss', str(seek_time), '-i', source_path,
             '-vframes', '1', '-vf', f'scale={size[0]}:-1',
-            '-q:v', '3', '-y', dest_path
+            '-q:v', '3', '-y', tmp_path
         ]
         try:
             print(f"Running ffmpeg command: {' '.join(ffmpeg_command)}")
             process = subprocess.run(ffmpeg_command, capture_output=True, text=True, check=True, timeout=15)
+            os.replace(tmp_path, dest_path)
             print(f"Successfully generated video thumbnail: {dest_path}")
             return True, dest_path
         except FileNotFoundError:
@@ -105,19 +289,26 @@ def generate_thumbnail(source_path, dest_path, size, media_type='image'):
             return False, None
         except subprocess.TimeoutExpired:
             print(f"ERROR: ffmpeg timed out generating thumbnail for {os.path.basename(source_path)}.")
+            _discard_file(tmp_path)
             return False, None
         except subprocess.CalledProcessError as e:
             print(f"ERROR: ffmpeg failed for {os.path.basename(source_path)}:")
             print(f"Stderr: {e.stderr}")
-            if os.path.exists(dest_path):
-                try: os.remove(dest_path)
-                except OSError: pass
+            _discard_file(tmp_path)
             return False, None
         except Exception as e:
              print(f"ERROR: Unexpected error generating video thumbnail for {os.path.basename(source_path)}: {e}")
              traceback.print_exc()
+             _discard_file(tmp_path)
              return False, None
     elif media_type == 'image':
+        if VIPS_AVAILABLE and _generate_image_thumbnail_vips(source_path, tmp_path, size):
+            try:
+                os.replace(tmp_path, dest_path)
+                return True, dest_path
+            except OSError as e:
+                print(f"ERROR: Could not move pyvips thumbnail into place, falling back to Pillow: {e}")
+                _discard_file(tmp_path)
         if not PIL_AVAILABLE:
             print("WARNING: Pillow not available, cannot generate image thumbnail.")
             return False, None
@@ -126,15 +317,21 @@ def generate_thumbnail(source_path, dest_path, size, media_type='image'):
                 print(f"ERROR: Source image file not found: {source_path}")
                 return False, None
             with Image.open(source_path) as img:
+                if img.format == 'JPEG':
+                    # Shrink-on-load: libjpeg decodes at 1/2, 1/4 or 1/8 scale. Ask for 2x the
+                    # target so the final LANCZOS step still has detail to work with.
+                    img.draft('RGB', (size[0] * 2, size[1] * 2))
                 if img.format == 'GIF' and getattr(img, 'is_animated', False):
                     img.seek(0)
                     if img.mode != 'RGB': img = img.convert('RGB')
-                img.thumbnail(size)
+                # reduce() by an integer factor first, then resample only the last <=3x step
+                img.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
                 thumb_format = current_app.config.get('THUMBNAIL_FORMAT', 'PNG') if current_app else 'PNG'
                 if thumb_format.upper() == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
                      img = img.convert('RGB')
-                img.save(dest_path, thumb_format)
-                return True, dest_path
+                img.save(tmp_path, thumb_format)
+            os.replace(tmp_path, dest_path)
+            return True, dest_path
         except UnidentifiedImageError:
             print(f"ERROR: Cannot identify image file {source_path}")
             return False, None
@@ -144,11 +341,68 @@ def generate_thumbnail(source_path, dest_path, size, media_type='image'):
         except Exception as e:
             print(f"ERROR: Generic exception generating image thumbnail: {e}")
             traceback.print_exc()
+            _discard_file(tmp_path)
             return False, None
     else:
         print(f"ERROR: Unknown media type '{media_type}' for thumbnail generation.")
         return False, None
 
+# --- Background Thumbnail Generation ---
+# Pillow releases the GIL while decoding/resampling (as does libvips) and ffmpeg runs as
+# a subprocess, so a thread pool keeps every core busy for a batch upload without the
+# pickling and app re-import a process pool would need. Sized from THUMBNAIL_WORKERS
+# on first use.
+_thumbnail_pool = None
+_thumbnail_pool_lock = threading.Lock()
+
+def _get_thumbnail_pool():
+    """Returns the shared thumbnail pool, creating it on first use."""
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        with _thumbnail_pool_lock:
+            if _thumbnail_pool is None:
+                workers = current_app.config.get('THUMBNAIL_WORKERS') or max(2, os.cpu_count() or 1)
+                # concurrent.futures already joins its workers at interpreter exit
+                _thumbnail_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='showgo-thumb')
+    return _thumbnail_pool
+
+def _generate_thumbnail_job(app, source_path, dest_path, size, media_type):
+    """Runs generate_thumbnail on a pool thread inside the given app's context."""
+    with app.app_context():
+        success, _ = generate_thumbnail(source_path, dest_path, size, media_type)
+        if not success:
+            print(f"Warning: Background thumbnail generation failed for {os.path.basename(source_path)}")
+        return success
+
+def submit_thumbnail_job(source_path, dest_path, size, media_type='image'):
+    """Queues thumbnail generation on the background pool and returns its Future."""
+    app = current_app._get_current_object()
+    return _get_thumbnail_pool().submit(_generate_thumbnail_job, app, source_path, dest_path, size, media_type)
+
+def regenerate_thumbnails_bulk(media_records, missing_only=True):
+    """Regenerates thumbnails for the given MediaFile records on the thumbnail pool.
+
+    Jobs run in parallel and the call blocks until all of them finish. Returns
+    (generated, failed) counts.
+    """
+    size = current_app.config.get('THUMBNAIL_SIZE', (150, 150))
+    thumbnail_folder = current_app.config['THUMBNAIL_FOLDER']
+    existing = _get_folder_listing(thumbnail_folder)[2] if missing_only else None
+    upload_files = get_upload_filenames()
+    futures = []
+    for media in media_records:
+        thumbnail_filename = media.get_thumbnail_filename()
+        if existing is not None and thumbnail_filename in existing:
+            continue
+        if upload_files is not None and media.get_disk_filename() not in upload_files:
+            continue # Original is missing; nothing to render from
+        futures.append(submit_thumbnail_job(media.get_upload_path(),
+                                            os.path.join(thumbnail_folder, thumbnail_filename),
+                                            size, media.media_type))
+    generated = sum(1 for future in futures if future.result())
+    forget_existing_thumbnails()
+    return generated, len(futures) - generated
+
 def is_web_friendly_video(source_path):
     """Checks if a video file has web-friendly video and audio codecs using ffprobe."""
     if not current_app:
@@ -164,7 +418,7 @@ def is_web_friendly_video(source_path):
     try:
         print(f"Running ffprobe for codec check: {' '.join(command)}")
         process = subprocess.run(command, capture_output=True, text=True, check=True, timeout=10)
-        data = json.loads(process.stdout)
+        data = _json_loads(process.stdout)
         if 'streams' not in data or not data['streams']:
             print(f"WARNING: No streams found by ffprobe for {os.path.basename(source_path)}")
             return False
@@ -204,42 +458,86 @@ def is_web_friendly_video(source_path):
 # --- End File Handling Helpers ---
 
 # --- Database Initialization/Self-Healing Function ---
+# Columns added after the first release. create_all() only creates missing tables,
+# so databases from older versions are topped up with ALTER TABLE on startup.
+_SCHEMA_ADDITIONS = [
+    # (table, column, column DDL, create index)
+    ('media_files', 'content_hash', 'VARCHAR(64)', True),
+    ('settings', 'last_updated', 'DATETIME', True),
+]
+
+def _add_missing_columns():
+    """Adds any _SCHEMA_ADDITIONS columns missing from existing tables."""
+    inspector = db.inspect(db.engine)
+    for table, column, ddl, indexed in _SCHEMA_ADDITIONS:
+        existing_columns = {col['name'] for col in inspector.get_columns(table)}
+        if column in existing_columns:
+            continue
+        print(f"Adding missing column: {table}.{column}")
+        with db.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+            if indexed:
+                conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})'))
+
+# Settings keys from older versions, removed on startup
+_OBSOLETE_SETTING_KEYS = frozenset({'widgets_weather_api_key'})
+
+# Settings version (database path + mtime) left by the last successful initialize_database.
+# Nothing can have dropped a table or removed a default row while the file is unchanged,
+# so repeat calls (e.g. several recovery branches in one request) skip the schema work.
+_db_initialized_version = None
+
 def initialize_database():
     """Creates tables if they don't exist and ensures default settings are populated."""
-    print("Attempting database initialization/check...")
+    global _db_initialized_version
     try:
         if not current_app:
             print("ERROR: Cannot initialize database outside application context.")
             return False
-        with current_app.app_context():
-            db.create_all()
-            print("Tables checked/created.")
-            defaults = current_app.config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB)
-            settings_added_count = 0
-            for key, default_value in defaults.items():
-                existing_setting = db.session.get(Setting, key)
-                if existing_setting is None:
-                    print(f"Adding missing default setting: {key} = {default_value}")
-                    new_setting = Setting(key=key, value=default_value)
-                    db.session.add(new_setting)
-                    settings_added_count += 1
-            if settings_added_count > 0:
-                try:
-                    db.session.commit()
-                    print(f"Added {settings_added_count} new default settings.")
-                except Exception as commit_err:
-                    db.session.rollback()
-                    print(f"ERROR committing new default settings: {commit_err}")
-                    traceback.print_exc()
-            else:
-                print("All default settings already present or no new defaults to add.")
-            old_api_key_setting = db.session.get(Setting, 'widgets_weather_api_key')
-            if old_api_key_setting:
-                print("Removing obsolete 'widgets_weather_api_key' setting...")
-                db.session.delete(old_api_key_setting)
-                db.session.commit()
-                print("Obsolete setting removed.")
+        settings_version = get_settings_version()
+        if settings_version is not None and settings_version == _db_initialized_version:
             return True
+        print("Attempting database initialization/check...")
+        # Callers already hold an app (or request) context; pushing another would also
+        # give this function a separate db.session from the caller's
+        db.create_all()
+        print("Tables checked/created.")
+        _add_missing_columns()
+        defaults = current_app.config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB)
+        # One query for the existing keys; missing defaults and obsolete-key removal
+        # then share a single commit
+        existing_keys = set(db.session.scalars(db.select(Setting.key)))
+        settings_added_count = 0
+        for key, default_value in defaults.items():
+            if key not in existing_keys:
+                if key == 'auth_password_hash' and default_value is None:
+                    # Only pay for the deliberately slow hash when the row is actually missing
+                    default_value = _default_password_hash()
+                print(f"Adding missing default setting: {key} = {default_value}")
+                new_setting = Setting(key=key, value=default_value)
+                db.session.add(new_setting)
+                settings_added_count += 1
+        obsolete_keys = existing_keys & _OBSOLETE_SETTING_KEYS
+        for key in obsolete_keys:
+            print(f"Removing obsolete '{key}' setting...")
+            db.session.delete(db.session.get(Setting, key))
+        if settings_added_count > 0 or obsolete_keys:
+            try:
+                db.session.commit()
+                invalidate_settings_cache()
+                if settings_added_count > 0:
+                    print(f"Added {settings_added_count} new default settings.")
+                if obsolete_keys:
+                    print("Obsolete settings removed.")
+            except Exception as commit_err:
+                db.session.rollback()
+                print(f"ERROR committing default settings changes: {commit_err}")
+                traceback.print_exc()
+                return True # Tables exist; not marked initialized so the next call retries
+        else:
+            print("All default settings already present or no new defaults to add.")
+        _db_initialized_version = get_settings_version()
+        return True
     except OperationalError as op_err:
         print(f"FATAL: Database connection/operation error during init: {op_err}")
         traceback.print_exc()
@@ -254,20 +552,198 @@ def initialize_database():
             print(f"Rollback error after generic Exception: {rb_err}")
         return False
 
+# --- Settings Cache ---
+# Settings are read on every request but change rarely. Every committed write to the
+# SQLite file bumps its mtime (in this process or another worker), so the settings
+# rows are cached per database file and reused while the mtime is unchanged.
+_settings_cache = {}
+
+# Coarse timestamps (2s on FAT/exFAT, 1s on some network mounts) can leave an mtime
+# unchanged by a second write in the same tick, so an mtime this recent is not trusted
+# as a cache key: anything read now might already be stale under the same key (the
+# "racy git" rule). Caches keyed on it are bypassed until the file has been quiet that long.
+_MTIME_GRANULARITY_NS = 2_000_000_000
+
+def _settled_mtime_ns(st):
+    """Returns st.st_mtime_ns if it is old enough to key a cache on, else None."""
+    if time.time_ns() - st.st_mtime_ns < _MTIME_GRANULARITY_NS:
+        return None
+    return st.st_mtime_ns
+
+def _database_mtime_ns():
+    """Returns (db_path, st_mtime_ns) for the SQLite file, or (db_path, None) if it is
+    unavailable or was written too recently to key a cache on."""
+    db_path = current_app.config.get('DATABASE_PATH')
+    if not db_path:
+        return None, None
+    try:
+        return db_path, _settled_mtime_ns(os.stat(db_path))
+    except OSError:
+        return db_path, None
+
+def get_settings_version():
+    """Returns a token that changes whenever the settings database is written, or None.
+
+    None (don't cache) is also returned for a short while after each write; see
+    _MTIME_GRANULARITY_NS.
+    """
+    db_path, mtime_ns = _database_mtime_ns()
+    return (db_path, mtime_ns) if mtime_ns is not None else None
+
+def invalidate_settings_cache():
+    """Drops cached settings (and the derived config timestamp) so the next read goes to the database."""
+    _settings_cache.clear()
+    _timestamp_cache.update(version=None, ts=None, expires=0.0)
+
+def _query_settings():
+    """Reads every settings row as {key: value}, selecting plain columns instead of Setting objects."""
+    return dict(db.session.execute(db.select(Setting.key, Setting.value)).all())
+
+def _get_db_settings():
+    """Returns {key: value} for every settings row, served from the cache while the DB file is unchanged.
+
+    Database errors propagate so callers keep their own recovery handling.
+    """
+    db_path, mtime_ns = _database_mtime_ns()
+    cached = _settings_cache.get(db_path)
+    if mtime_ns is not None and cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    db_settings_dict = _query_settings()
+    if mtime_ns is not None:
+        _settings_cache[db_path] = (mtime_ns, db_settings_dict)
+    return db_settings_dict
+
+# --- Credential Check Cache ---
+# check_password_hash is deliberately slow and browsers resend Basic credentials with
+# every request, so results are memoized for a short TTL. Keys hold the stored hash and
+# a SHA-256 digest of the password (never the plaintext); a new stored hash never hits.
+_CREDENTIAL_CACHE_TTL = 60 # seconds
+_CREDENTIAL_CACHE_MAX = 128
+_credential_cache = {}
+_credential_cache_lock = threading.Lock() # gthread workers share the dict; the KDF runs outside it
+
+# --- Login Throttling ---
+# Each uncached check runs the KDF, so a flood of bad credentials is a cheap way to burn
+# server CPU. Failed checks are counted per client in a sliding window; once a client is
+# over the limit its uncached checks are refused with LoginThrottled (a 429) until the
+# window passes. Cached results (a logged-in browser resending its credentials) and
+# successful checks never count. Behind a reverse proxy, set PROXY_FIX_X_FOR so clients
+# are told apart by their real address rather than the proxy's.
+_LOGIN_RATE_LIMIT_ATTEMPTS = 5
+_LOGIN_RATE_LIMIT_WINDOW = 10 # seconds
+_LOGIN_TRACKED_CLIENTS_MAX = 1024
+_login_attempts = {}
+_login_attempts_lock = threading.Lock()
+
+class LoginThrottled(Exception):
+    """Raised by check_password_cached when a client has too many recent failed checks."""
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed login attempts; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+def _prune_login_attempts(attempts, now):
+    """Drops attempts that have left the window from a client's deque."""
+    while attempts and attempts[0] <= now - _LOGIN_RATE_LIMIT_WINDOW:
+        attempts.popleft()
+
+def _login_retry_after(client_id, now):
+    """Returns seconds until client_id may try again, or 0 if it isn't throttled."""
+    with _login_attempts_lock:
+        attempts = _login_attempts.get(client_id)
+        if attempts is None:
+            return 0
+        _prune_login_attempts(attempts, now)
+        if len(attempts) < _LOGIN_RATE_LIMIT_ATTEMPTS:
+            return 0
+        return max(1, int(attempts[0] + _LOGIN_RATE_LIMIT_WINDOW - now) + 1)
+
+def _record_login_failure(client_id, now):
+    """Counts a failed KDF check against client_id."""
+    with _login_attempts_lock:
+        attempts = _login_attempts.get(client_id)
+        if attempts is None:
+            if len(_login_attempts) >= _LOGIN_TRACKED_CLIENTS_MAX:
+                # Forget clients with nothing left in the window first, then the oldest
+                for idle_id in [cid for cid, q in _login_attempts.items()
+                                if not q or q[-1] <= now - _LOGIN_RATE_LIMIT_WINDOW]:
+                    del _login_attempts[idle_id]
+                while len(_login_attempts) >= _LOGIN_TRACKED_CLIENTS_MAX:
+                    del _login_attempts[next(iter(_login_attempts))]
+            attempts = _login_attempts[client_id] = deque()
+        _prune_login_attempts(attempts, now)
+        attempts.append(now)
+
+def check_password_cached(stored_password_hash, password, client_id=None):
+    """check_password_hash with a short-lived cache of recent results.
+
+    When client_id is given, failed uncached checks are counted per client; a client
+    over the limit gets LoginThrottled instead of a KDF run.
+    """
+    key = (stored_password_hash, hashlib.sha256(password.encode('utf-8')).digest())
+    now = time.monotonic()
+    with _credential_cache_lock:
+        cached = _credential_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    if client_id is not None:
+        retry_after = _login_retry_after(client_id, now)
+        if retry_after:
+            print(f"Login attempts from {client_id} throttled for {retry_after}s.")
+            raise LoginThrottled(retry_after)
+    result = check_password_hash(stored_password_hash, password)
+    if not result and client_id is not None:
+        _record_login_failure(client_id, now)
+    with _credential_cache_lock:
+        if len(_credential_cache) >= _CREDENTIAL_CACHE_MAX:
+            # Drop expired entries first so a burst of bad guesses can't evict a live login
+            for expired_key in [k for k, (expires, _) in list(_credential_cache.items()) if expires <= now]:
+                del _credential_cache[expired_key]
+            if len(_credential_cache) >= _CREDENTIAL_CACHE_MAX:
+                _credential_cache.clear()
+        _credential_cache[key] = (now + _CREDENTIAL_CACHE_TTL, result)
+    return result
+
+def hash_password(password):
+    """generate_password_hash using the app's configured PASSWORD_HASH_METHOD."""
+    method = current_app.config.get('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD) if current_app else PASSWORD_HASH_METHOD
+    return generate_password_hash(password, method=method)
+
+@lru_cache(maxsize=None)
+def get_dummy_password_hash():
+    """Returns a throwaway hash (created on first use) for equalizing failed-login timing."""
+    return hash_password(os.urandom(16).hex())
+
+@lru_cache(maxsize=None)
+def _default_password_hash():
+    """Hash of DEFAULT_PASSWORD, computed on first use and reused by later re-seeds."""
+    return hash_password(DEFAULT_PASSWORD)
+
+def get_auth_credentials():
+    """Returns (username, password_hash) from one settings snapshot, for the auth hot path."""
+    try:
+        if current_app:
+            db_settings = _get_db_settings()
+            return db_settings.get('auth_username', 'admin'), db_settings.get('auth_password_hash')
+    except Exception as e:
+        print(f"Error reading auth settings from cache: {e}. Falling back to get_setting.")
+    # get_setting carries the table-recovery and default handling
+    return get_setting('auth_username', 'admin'), get_setting('auth_password_hash')
+
 # --- Configuration Loading/Saving ---
 def get_setting(key, default=None):
     """Gets a setting value from database, with fallback and recovery."""
     try:
         if not current_app: return default
-        setting = Setting.query.filter_by(key=key).first()
-        if setting: return setting.value
+        # One cached snapshot serves every get_setting call until the DB changes
+        db_settings = _get_db_settings()
+        if key in db_settings: return db_settings[key]
     except ProgrammingError as e:
         print(f"Database programming error getting setting '{key}': {e}. Attempting recovery.")
         if initialize_database():
             print(f"Recovery ok. Retrying get '{key}'.")
             try:
-                setting = Setting.query.filter_by(key=key).first()
-                return setting.value if setting else default
+                value = db.session.scalar(db.select(Setting.value).where(Setting.key == key))
+                return value if value is not None else default
             except Exception as retry_e:
                 print(f"ERROR getting '{key}' post-recovery: {retry_e}")
         else:
@@ -281,56 +757,122 @@ def get_setting(key, default=None):
     default_settings = app_config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB)
     return default if default is not None else default_settings.get(key)
 
+def copy_settings(settings_dict):
+    """Copies a flat settings dict, including list/dict values, so callers never alias
+    DEFAULT_SETTINGS_DB or the cached DB snapshot (e.g. burn_in_prevention_elements)."""
+    return {key: value.copy() if isinstance(value, (list, dict)) else value
+            for key, value in settings_dict.items()}
+
 def load_settings_from_db():
     """Loads all settings, attempting recovery if table is missing. Returns merged dict."""
-    defaults = current_app.config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB) if current_app else DEFAULT_SETTINGS_DB.copy()
-    settings_dict = defaults.copy()
-    if not current_app: return settings_dict
+    defaults = current_app.config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB) if current_app else DEFAULT_SETTINGS_DB
+    if not current_app: return copy_settings(defaults)
     try:
-        settings = Setting.query.all()
-        db_settings_dict = {setting.key: setting.value for setting in settings}
-        settings_dict.update(db_settings_dict)
+        # DB values win over defaults
+        settings_dict = copy_settings(defaults | _get_db_settings())
     except ProgrammingError as e:
         print(f"Database programming error loading settings: {e}. Attempting recovery.")
         if initialize_database():
             print("Recovery ok. Retrying settings load.")
             try:
-                settings = Setting.query.all()
-                db_settings_dict = {setting.key: setting.value for setting in settings}
-                settings_dict = defaults.copy()
-                settings_dict.update(db_settings_dict)
+                settings_dict = copy_settings(defaults | _query_settings())
             except Exception as retry_e:
                 print(f"ERROR loading settings post-recovery: {retry_e}")
                 traceback.print_exc()
                 print("Falling back to defaults.")
-                settings_dict = defaults.copy()
+                settings_dict = copy_settings(defaults)
         else:
             print("ERROR: DB recovery failed. Falling back to defaults.")
-            settings_dict = defaults.copy()
+            settings_dict = copy_settings(defaults)
     except OperationalError as op_e:
          print(f"Database operational error loading settings: {op_e}")
          print("Falling back to defaults.")
-         settings_dict = defaults.copy()
+         settings_dict = copy_settings(defaults)
     except Exception as e:
         print(f"Error loading settings from DB: {e}. Falling back to defaults.")
         traceback.print_exc()
-        settings_dict = defaults.copy()
+        settings_dict = copy_settings(defaults)
     return settings_dict
 
+def get_settings_view():
+    """Returns a read-only merged view of DB settings over defaults without copying either.
+
+    A ChainMap looks keys up in the cached DB snapshot, then the defaults; callers must not
+    mutate it (use load_settings_from_db for a private copy). Falls back to
+    load_settings_from_db, with its recovery handling, if the snapshot can't be read.
+    """
+    defaults = current_app.config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB) if current_app else DEFAULT_SETTINGS_DB
+    try:
+        if current_app:
+            return ChainMap(_get_db_settings(), defaults)
+    except Exception as e:
+        print(f"Error reading settings snapshot: {e}. Loading settings with recovery.")
+    return load_settings_from_db()
+
+def _compile_layout(layout):
+    """Flattens a SETTINGS_LAYOUT dict into ((name, key, sub_layout), ...) tuples once at import."""
+    return tuple((name, None, _compile_layout(key)) if isinstance(key, dict) else (name, key, None)
+                 for name, key in layout.items())
+
+_COMPILED_SETTINGS_LAYOUT = _compile_layout(SETTINGS_LAYOUT)
+
+def build_nested_settings(settings_dict, layout=_COMPILED_SETTINGS_LAYOUT, defaults=DEFAULT_SETTINGS_DB):
+    """Builds the nested template config from flat settings in one recursive walk of layout."""
+    nested = {}
+    for name, key, sub_layout in layout:
+        if sub_layout is not None:
+            nested[name] = build_nested_settings(settings_dict, sub_layout, defaults)
+        else:
+            value = settings_dict.get(key, defaults.get(key))
+            # Lists may belong to a shared settings view; give the caller its own
+            nested[name] = value.copy() if isinstance(value, list) else value
+    return nested
+
+# Nested form of the settings snapshot for read-only views (the general config page).
+# Keyed on the identity of the cached snapshot, which is replaced whenever the database
+# changes, so there is nothing extra to invalidate.
+_nested_settings_cache = {}
+
+def get_nested_settings_view():
+    """Returns build_nested_settings(get_settings_view()), built once per settings snapshot.
+
+    The result is shared between requests; callers must not mutate it.
+    """
+    try:
+        db_settings = _get_db_settings() if current_app else None
+    except Exception as e:
+        print(f"Error reading settings snapshot: {e}. Building nested settings uncached.")
+        db_settings = None
+    if db_settings is None:
+        return build_nested_settings(get_settings_view())
+    cached = _nested_settings_cache.get('nested')
+    if cached is not None and cached[0] is db_settings:
+        return cached[1]
+    defaults = current_app.config.get('DEFAULT_SETTINGS_DB', DEFAULT_SETTINGS_DB)
+    nested = build_nested_settings(ChainMap(db_settings, defaults))
+    _nested_settings_cache['nested'] = (db_settings, nested)
+    return nested
+
 def save_setting(key, value):
     """Saves a setting, attempting recovery if table is missing."""
     if not current_app:
         print("ERROR: Cannot save setting without app context.")
         return False
+    if key == 'auth_password_hash':
+        with _credential_cache_lock:
+            _credential_cache.clear()
     try:
         setting = db.session.get(Setting, key)
         # *** CORRECTED SYNTAX: if/else block properly formatted ***
         if setting:
+            if setting.value == value:
+                return True # Unchanged; skip the write and commit
             setting.value = value
         else:
             setting = Setting(key=key, value=value)
             db.session.add(setting)
         db.session.commit()
+        invalidate_settings_cache()
         return True
     except ProgrammingError as e:
          print(f"Database programming error saving setting '{key}': {e}. Attempting recovery.")
@@ -345,6 +887,7 @@ def save_setting(key, value):
                      setting = Setting(key=key, value=value)
                      db.session.add(setting)
                  db.session.commit()
+                 invalidate_settings_cache()
                  return True
              except Exception as retry_e:
                  db.session.rollback()
@@ -365,17 +908,96 @@ def save_setting(key, value):
         traceback.print_exc()
         return False
 
+def _apply_settings(values):
+    """Stages changed settings from values in the session and commits once. Returns True if anything changed."""
+    existing = {setting.key: setting for setting in Setting.query.filter(Setting.key.in_(list(values)))}
+    changed = False
+    for key, value in values.items():
+        setting = existing.get(key)
+        if setting is None:
+            db.session.add(Setting(key=key, value=value))
+            changed = True
+        elif setting.value != value:
+            setting.value = value
+            changed = True
+    if changed:
+        db.session.commit()
+        invalidate_settings_cache()
+    return changed
+
+def save_settings(values):
+    """Saves several settings in one query and one commit, attempting recovery if table is missing."""
+    if not current_app:
+        print("ERROR: Cannot save settings without app context.")
+        return False
+    if 'auth_password_hash' in values:
+        with _credential_cache_lock:
+            _credential_cache.clear()
+    try:
+        _apply_settings(values)
+        return True
+    except ProgrammingError as e:
+        print(f"Database programming error saving settings: {e}. Attempting recovery.")
+        db.session.rollback()
+        if initialize_database():
+            print("Recovery ok. Retrying settings save.")
+            try:
+                _apply_settings(values)
+                return True
+            except Exception as retry_e:
+                db.session.rollback()
+                print(f"ERROR saving settings post-recovery: {retry_e}")
+                traceback.print_exc()
+                return False
+        else:
+            print("ERROR: DB recovery failed saving settings.")
+            return False
+    except OperationalError as op_e:
+        db.session.rollback()
+        print(f"Database operational error saving settings: {op_e}")
+        return False
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving settings: {e}")
+        traceback.print_exc()
+        return False
+
+# --- Config Timestamp Cache ---
+# The slideshow polls /api/config/check; the timestamp only changes when the database
+# is written, so it is cached per settings version. Within _TIMESTAMP_CACHE_TTL even the
+# version stat is skipped, bounding how often a poll touches the filesystem.
+_TIMESTAMP_CACHE_TTL = 1.0 # seconds
+_timestamp_cache = {'version': None, 'ts': None, 'expires': 0.0}
+
 def get_config_timestamp_from_db():
      """Gets the most recent timestamp reflecting changes to settings or media library."""
      if not current_app:
          print("ERROR: Cannot get timestamp without app context.")
          return None
+     now = time.monotonic()
+     cache = _timestamp_cache
+     if cache['ts'] is not None and now < cache['expires']:
+         return cache['ts']
+     settings_version = get_settings_version()
+     if settings_version is not None and cache['ts'] is not None and cache['version'] == settings_version:
+         cache['expires'] = now + _TIMESTAMP_CACHE_TTL
+         return cache['ts']
+     most_recent_ts = _query_config_timestamp()
+     if most_recent_ts is not None and settings_version is not None:
+         cache.update(version=settings_version, ts=most_recent_ts, expires=now + _TIMESTAMP_CACHE_TTL)
+     return most_recent_ts
+
+def _query_config_timestamp():
+     """Reads the config timestamp from the database (uncached)."""
      latest_setting_ts = 0.0
      media_changed_ts = 0.0
      try:
-          latest_setting = Setting.query.order_by(Setting.last_updated.desc()).first()
-          if latest_setting and isinstance(latest_setting.last_updated, datetime):
-              latest_setting_ts = latest_setting.last_updated.timestamp()
+          # Index-backed MAX() returns one scalar without loading (or JSON-decoding) any row
+          latest_updated = db.session.query(func.max(Setting.last_updated)).scalar()
+          if isinstance(latest_updated, datetime):
+              if latest_updated.tzinfo is None: # SQLite drops the tzinfo; values are stored in UTC
+                  latest_updated = latest_updated.replace(tzinfo=timezone.utc)
+              latest_setting_ts = latest_updated.timestamp()
           media_ts_value = get_setting('media_last_changed', 0.0)
           if isinstance(media_ts_value, (int, float)):
               media_changed_ts = float(media_ts_value)
@@ -388,7 +1010,7 @@ def get_config_timestamp_from_db():
           print(f"Database programming error getting timestamp: {e}. Attempting recovery.")
           if initialize_database():
               print("Recovery ok. Retrying timestamp check.")
-              return get_config_timestamp_from_db() # Retry
+              return _query_config_timestamp() # Retry
           else:
               print("ERROR: DB recovery failed during timestamp check.")
               return None
@@ -440,14 +1062,102 @@ def find_missing_media_files(db_media):
     if not current_app:
         print("ERROR: Cannot check files without app context.")
         return missing
+    upload_files = get_upload_filenames()
     for media in db_media:
-        if not media.check_files_exist():
-            media.missing_info = []
-            if not os.path.isfile(media.get_upload_path()):
-                media.missing_info.append(f"Original ({media.get_disk_filename()})")
+        if upload_files is not None:
+            file_exists = media.get_disk_filename() in upload_files
+        else:
+            file_exists = media.check_files_exist()
+        if not file_exists:
+            # Only the original is checked, so the lookup above already says what's missing
+            media.missing_info = [f"Original ({media.get_disk_filename()})"]
             missing.append(media)
     return missing
 
+# Thumbnail paths already seen on disk by serve_thumbnail, so repeat requests skip the
+# isfile() check. Missing ones are never cached because the background job may still be
+# writing them. Anything that deletes or rewrites thumbnails calls
+# forget_existing_thumbnails() so a removed file gets the placeholder again, not a 404.
+_existing_thumbnails = set()
+_EXISTING_THUMBNAILS_MAX = 8192
+
+def is_existing_thumbnail(path):
+    """Returns True if serve_thumbnail has already found path on disk."""
+    return path in _existing_thumbnails
+
+def remember_existing_thumbnail(path):
+    """Records that path exists on disk."""
+    if len(_existing_thumbnails) >= _EXISTING_THUMBNAILS_MAX:
+        _existing_thumbnails.clear()
+    _existing_thumbnails.add(path)
+
+def forget_existing_thumbnails(path=None):
+    """Drops path (or every path, when None) from the known-thumbnail set."""
+    if path is None:
+        _existing_thumbnails.clear()
+    else:
+        _existing_thumbnails.discard(path)
+
+# A directory's mtime changes whenever an entry is added, removed or renamed, so a
+# listing keyed on st_mtime_ns stays valid until an upload/delete touches the folder.
+# A listing taken within _MTIME_GRANULARITY_NS of the mtime is not trusted and the
+# folder is listed again on the next call.
+_folder_listing_cache = {}
+
+def _get_folder_listing(folder):
+    """Returns the cached (mtime_ns, entries, file_names) listing for a folder."""
+    mtime_ns = os.stat(folder).st_mtime_ns
+    cached = _folder_listing_cache.get(folder)
+    if cached is not None and cached[0][0] == mtime_ns and cached[0][1]:
+        return cached[1]
+    # scandir's DirEntry answers is_dir/is_file from the readdir type byte on most
+    # filesystems, avoiding a stat() per entry (it follows symlinks like os.path does)
+    listed_at_ns = time.time_ns()
+    with os.scandir(folder) as it:
+        entries = [(entry.name, entry.is_dir(), entry.is_file()) for entry in it]
+    if cached is not None and cached[1][1] == entries:
+        listing = cached[1] # Unchanged; keep the same objects for identity-keyed callers
+    else:
+        file_names = frozenset(name for name, _, is_file in entries if is_file)
+        listing = (mtime_ns, entries, file_names)
+    settled = listed_at_ns - mtime_ns >= _MTIME_GRANULARITY_NS
+    _folder_listing_cache[folder] = ((mtime_ns, settled), listing)
+    return listing
+
+def _list_folder(folder):
+    """Returns [(name, is_dir, is_file)] for a folder, cached until its mtime changes."""
+    return _get_folder_listing(folder)[1]
+
+def get_upload_filenames():
+    """Returns a frozenset of the file names in UPLOAD_FOLDER, or None if it can't be listed.
+
+    Lets callers check many media files with set lookups instead of a stat() each.
+    """
+    try:
+        return _get_folder_listing(current_app.config['UPLOAD_FOLDER'])[2]
+    except (OSError, KeyError) as e:
+        print(f"Error listing upload folder: {e}")
+        return None
+
+def get_media_state_etag():
+    """Returns an ETag for the media library state, or None if it can't be determined.
+
+    Derived from the mtimes of the database file and the upload/thumbnail folders: any
+    media or settings commit, upload, delete or thumbnail write changes at least one.
+    None while any of them was written too recently to be trusted (no 304 is sent).
+    """
+    try:
+        mtimes = [_settled_mtime_ns(os.stat(current_app.config[key]))
+                  for key in ('DATABASE_PATH', 'UPLOAD_FOLDER', 'THUMBNAIL_FOLDER')]
+    except (OSError, KeyError):
+        return None
+    if None in mtimes:
+        return None
+    return hashlib.md5(repr(mtimes).encode()).hexdigest()
+
+# Media and thumbnails are stored as uuid4().hex names: 32 lowercase hex digits
+_UUID_HEX_RE = re.compile(r'[0-9a-f]{32}')
+
 def find_unexpected_items(db_uuids):
     """Scans uploads and thumbnails folders for items not corresponding to DB entries."""
     orphaned_uuid_files = []
@@ -464,15 +1174,14 @@ def find_unexpected_items(db_uuids):
 
     if os.path.isdir(upload_folder):
         try:
-            for item_name in os.listdir(upload_folder):
-                item_path = os.path.join(upload_folder, item_name)
+            for item_name, is_dir, is_file in _list_folder(upload_folder):
                 item_info = {'folder': 'uploads', 'name': item_name}
-                if os.path.isdir(item_path):
+                if is_dir:
                     unexpected_dirs.append(item_info)
-                elif os.path.isfile(item_path):
+                elif is_file:
                     uuid_part, ext = os.path.splitext(item_name)
                     ext_lower = ext.lower().lstrip('.')
-                    is_uuid_format = len(uuid_part) == 32 and all(c in '0123456789abcdef' for c in uuid_part)
+                    is_uuid_format = _UUID_HEX_RE.fullmatch(uuid_part) is not None
                     is_known_media_ext = ext_lower in allowed_media_extensions
                     if is_uuid_format and is_known_media_ext and uuid_part not in db_uuids:
                         orphaned_uuid_files.append(item_info)
@@ -483,24 +1192,22 @@ def find_unexpected_items(db_uuids):
     else:
         print(f"Warning: Upload directory not found: {upload_folder}")
 
+    # Names within one folder listing are unique and every entry is tagged with its
+    # folder, so neither pass needs to check the lists for duplicates
     if os.path.isdir(thumbnail_folder):
         try:
-            for item_name in os.listdir(thumbnail_folder):
-                item_path = os.path.join(thumbnail_folder, item_name)
+            for item_name, is_dir, is_file in _list_folder(thumbnail_folder):
                 item_info = {'folder': 'thumbnails', 'name': item_name}
-                if os.path.isdir(item_path):
-                    if not any(d['name'] == item_name and d['folder'] == 'thumbnails' for d in unexpected_dirs):
-                        unexpected_dirs.append(item_info)
-                elif os.path.isfile(item_path):
+                if is_dir:
+                    unexpected_dirs.append(item_info)
+                elif is_file:
                     uuid_part, ext = os.path.splitext(item_name)
-                    is_uuid_format = len(uuid_part) == 32 and all(c in '0123456789abcdef' for c in uuid_part)
+                    is_uuid_format = _UUID_HEX_RE.fullmatch(uuid_part) is not None
                     is_expected_thumb_ext = ext.lower() == thumbnail_ext
                     if is_uuid_format and is_expected_thumb_ext and uuid_part not in db_uuids:
-                         if not any(f['name'] == item_name and f['folder'] == 'thumbnails' for f in orphaned_uuid_files):
-                             orphaned_uuid_files.append(item_info)
+                         orphaned_uuid_files.append(item_info)
                     elif not is_uuid_format and item_name.lower() not in ['.ds_store', 'thumbs.db']:
-                         if not any(f['name'] == item_name and f['folder'] == 'thumbnails' for f in unexpected_files):
-                              unexpected_files.append(item_info)
+                         unexpected_files.append(item_info)
         except OSError as e:
             print(f"Error reading directory {thumbnail_folder}: {e}")
     else:
@@ -549,6 +1256,7 @@ def cleanup_unexpected_items(items_to_delete):
             print(f"Unexpected error deleting item {item['folder']}/{item['name']}: {e}")
             traceback.print_exc()
             error_count += 1
+    forget_existing_thumbnails()
     return deleted_files, deleted_dirs, error_count
 
 def remove_missing_media_db_entries(missing_media_ids):
@@ -562,47 +1270,33 @@ def remove_missing_media_db_entries(missing_media_ids):
     if not missing_media_ids:
         return 0, 0
 
-    media_changed = False # Track if commit is needed
-
+    media_ids = set()
     for media_id_str in missing_media_ids:
         try:
-            media_id = int(media_id_str)
-            media_record = db.session.get(MediaFile, media_id)
-            if media_record:
-                print(f"Removing DB record for missing media ID {media_id} ('{media_record.display_name}')")
-                db.session.delete(media_record)
-                deleted_count += 1
-                media_changed = True
-            else:
-                print(f"DB record for missing media ID {media_id} not found (already deleted?).")
+            media_ids.add(int(media_id_str))
         except ValueError:
             print(f"Invalid media ID received for deletion: {media_id_str}")
             error_count += 1
-        except Exception as e:
-            print(f"Error deleting DB record for missing media ID {media_id_str}: {e}")
-            traceback.print_exc()
-            error_count += 1
-            db.session.rollback() # Rollback this specific error
+    if not media_ids:
+        return 0, error_count
 
-    if media_changed and error_count == 0:
-        try:
-            db.session.commit()
-        except Exception as e:
-            print(f"Error committing deletions of missing DB entries: {e}")
-            traceback.print_exc()
-            flash("Database error occurred while committing deletions.", "error")
-            db.session.rollback()
-            return 0, deleted_count + error_count
-    elif media_changed: # Handle partial success
-        try:
-            db.session.commit()
-            print(f"Committed deletion of {deleted_count} missing DB entries despite {error_count} errors during processing.")
-        except Exception as e:
-            print(f"Error committing partial deletions: {e}")
-            traceback.print_exc()
-            flash("Database error occurred while committing partial deletions.", "error")
-            db.session.rollback()
-            return 0, deleted_count + error_count
+    # One DELETE ... WHERE id IN (...) instead of a SELECT and DELETE per record
+    try:
+        result = db.session.execute(
+            db.delete(MediaFile).where(MediaFile.id.in_(media_ids)),
+            execution_options={'synchronize_session': False})
+        db.session.commit()
+        deleted_count = result.rowcount
+        forget_existing_thumbnails()
+        print(f"Removed {deleted_count} DB record(s) for missing media IDs {sorted(media_ids)}")
+        if deleted_count < len(media_ids):
+            print(f"{len(media_ids) - deleted_count} of the requested media IDs were not found (already deleted?).")
+    except Exception as e:
+        print(f"Error deleting DB records for missing media: {e}")
+        traceback.print_exc()
+        flash("Database error occurred while committing deletions.", "error")
+        db.session.rollback()
+        return 0, len(media_ids) + error_count
 
     return deleted_count, error_count
 # --- END Validation Helpers ---
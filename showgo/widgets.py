@@ -0,0 +1,193 @@
+# showgo/widgets.py
+# Weather and RSS widget data for the slideshow, cached in memory and refreshed by a
+# background thread so slideshow page loads don't wait on third-party servers.
+
+import os
+import re
+import time
+import threading
+import traceback
+import xml.etree.ElementTree as ET
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import feedparser
+
+# --- Widget Data Cache ---
+# Keys are ('weather', location, api_key) or ('rss', feed_url, user_agent). Each entry holds
+# the last (data, error) result plus monotonic 'fetched' / 'requested' times. Only the
+# first request for a key fetches inline; after that the refresher keeps it current.
+_widget_cache = {}
+_widget_cache_lock = threading.Lock()
+_WIDGET_IDLE_EXPIRY = 3600 # seconds; keys no slideshow has asked for are dropped
+_REFRESHER_POLL_MAX = 60 # seconds between refresher passes (at most)
+# Failed fetches stay cached (so clients don't retry on every load) but only this long
+_WIDGET_ERROR_RETRY_SECONDS = 60
+
+# Keep-alive connection pool for the outbound widget requests
+_session = requests.Session()
+# Runs independent fetches (weather and RSS, or several stale entries) concurrently
+# so a cold page load or refresher pass waits for the slowest fetch, not the sum
+_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='showgo-widget-fetch')
+
+_refresher_pid = None # PID that owns the running refresher thread (threads don't survive fork)
+
+
+def _fetch_weather(location, api_key):
+    """Fetches current weather from OpenWeatherMap. Returns (weather_data, weather_error)."""
+    try:
+        weather_url = f"https://api.openweathermap.org/data/2.5/weather?q={location}&appid={api_key}&units=imperial"
+        response = _session.get(weather_url, timeout=10)
+        response.raise_for_status()
+        return response.json(), None
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching weather data: {e}")
+        return None, f"Network/API Error: {e}"
+    except Exception as e:
+        print(f"Unexpected error processing weather data: {e}")
+        traceback.print_exc()
+        return None, f"Processing Error: {e}"
+
+
+# Last response validators per feed URL: (etag, last_modified, headlines). A conditional
+# GET answered with 304 reuses the headlines without downloading or parsing the feed.
+_rss_validators = {}
+_RSS_MAX_HEADLINES = 15
+_RSS_ESCAPED_MARKUP_RE = re.compile(r'<|&#?\w+;') # Markup or entities left in a decoded title
+
+
+def _parse_rss_fast(content):
+    """Extracts headlines from a plain RSS 2.0 document with ElementTree (expat, in C).
+
+    Returns None for anything it doesn't fully understand (Atom, RSS 1.0, DTDs, markup in
+    titles, malformed XML) so the caller falls back to feedparser.
+    """
+    if b'<!DOCTYPE' in content or b'<!ENTITY' in content:
+        return None
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return None
+    channel = root.find('channel') if root.tag == 'rss' else None
+    if channel is None:
+        return None
+    headlines = []
+    for item in islice(channel.iterfind('item'), _RSS_MAX_HEADLINES):
+        title = (item.findtext('title') or '').strip() or 'No Title'
+        if _RSS_ESCAPED_MARKUP_RE.search(title): # Escaped HTML; feedparser knows how to clean it
+            return None
+        headlines.append({'title': title, 'link': (item.findtext('link') or '').strip() or '#'})
+    return headlines or None
+
+
+def _fetch_rss(feed_url, user_agent):
+    """Fetches and parses an RSS feed. Returns (headlines, rss_error)."""
+    try:
+        headers = {'User-Agent': user_agent}
+        etag, last_modified, cached_headlines = _rss_validators.get(feed_url, (None, None, None))
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = _session.get(feed_url, headers=headers, timeout=10)
+        if response.status_code == 304 and cached_headlines is not None:
+            return cached_headlines, None
+        response.raise_for_status()
+        headlines = _parse_rss_fast(response.content)
+        if headlines is not None:
+            _rss_validators[feed_url] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), headlines)
+            return headlines, None
+        rss_data_raw = feedparser.parse(response.content)
+        if rss_data_raw.bozo and not rss_data_raw.entries:
+            bozo_exception_msg = str(rss_data_raw.bozo_exception) if hasattr(rss_data_raw, 'bozo_exception') else "Unknown parsing issue"
+            print(f"Error parsing RSS feed (bozo): {feed_url} - {bozo_exception_msg}")
+            return None, f"Feed Parsing Error: {bozo_exception_msg}"
+        elif rss_data_raw.entries:
+            headlines = [{'title': entry.get('title', 'No Title'), 'link': entry.get('link', '#')}
+                         for entry in islice(rss_data_raw.entries, _RSS_MAX_HEADLINES)]
+            _rss_validators[feed_url] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), headlines)
+            return headlines, None
+        else:
+            print(f"RSS feed parsed but no entries found: {feed_url}")
+            return None, "Feed Empty"
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching RSS feed: {e}")
+        return None, f"Fetch/Parse Error: {e}"
+    except Exception as e:
+        print(f"Error fetching or parsing RSS feed: {e}")
+        traceback.print_exc()
+        return None, f"Fetch/Parse Error: {e}"
+
+
+_FETCHERS = {
+    'weather': _fetch_weather,
+    'rss': _fetch_rss,
+}
+
+
+def _refresh_stale_entries(refresh_seconds):
+    """Re-fetches cached entries older than refresh_seconds (failed ones sooner) and drops idle ones."""
+    now = time.monotonic()
+    error_retry_seconds = min(refresh_seconds, _WIDGET_ERROR_RETRY_SECONDS)
+    with _widget_cache_lock:
+        for key in [key for key, entry in _widget_cache.items() if now - entry['requested'] > _WIDGET_IDLE_EXPIRY]:
+            del _widget_cache[key]
+        stale_keys = [key for key, entry in _widget_cache.items()
+                      if now - entry['fetched'] >= (error_retry_seconds if entry['error'] else refresh_seconds)]
+    results = _fetch_pool.map(lambda key: _FETCHERS[key[0]](*key[1:]), stale_keys)
+    for key, (data, error) in zip(stale_keys, results):
+        with _widget_cache_lock:
+            entry = _widget_cache.get(key)
+            if entry is not None:
+                entry.update(data=data, error=error, fetched=time.monotonic())
+
+
+def _refresher_loop(refresh_seconds):
+    """Background loop keeping cached widget data fresh."""
+    while True:
+        time.sleep(min(refresh_seconds, _REFRESHER_POLL_MAX))
+        try:
+            _refresh_stale_entries(refresh_seconds)
+        except Exception as e:
+            print(f"ERROR: Widget refresher pass failed: {e}")
+            traceback.print_exc()
+
+
+def _ensure_refresher(refresh_seconds):
+    """Starts the refresher thread once per process (again in each forked worker)."""
+    global _refresher_pid
+    pid = os.getpid()
+    if _refresher_pid == pid:
+        return
+    with _widget_cache_lock:
+        if _refresher_pid == pid:
+            return
+        _refresher_pid = pid
+    threading.Thread(target=_refresher_loop, args=(refresh_seconds,),
+                     name='showgo-widgets', daemon=True).start()
+
+
+def get_widget_data(refresh_seconds, lookups):
+    """Returns {name: (data, error)} for lookups given as {name: (kind, *args)}.
+
+    Cached entries are returned as-is; cold misses are fetched in parallel on first use.
+    """
+    _ensure_refresher(refresh_seconds)
+    now = time.monotonic()
+    results = {}
+    misses = {}
+    with _widget_cache_lock:
+        for name, key in lookups.items():
+            entry = _widget_cache.get(key)
+            if entry is not None:
+                entry['requested'] = now
+                results[name] = entry['data'], entry['error']
+            else:
+                misses[name] = key
+    futures = {name: _fetch_pool.submit(_FETCHERS[key[0]], *key[1:]) for name, key in misses.items()}
+    for name, future in futures.items():
+        data, error = results[name] = future.result()
+        with _widget_cache_lock:
+            _widget_cache[misses[name]] = {'data': data, 'error': error, 'fetched': time.monotonic(), 'requested': now}
+    return results
+
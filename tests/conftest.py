@@ -0,0 +1,95 @@
+# tests/conftest.py
+# Shared fixtures: a ShowGo app on temporary folders and a logged-in test client
+
+import base64
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from showgo import create_app, utils
+from showgo.config import Config, DEFAULT_PASSWORD
+
+
+def make_config(tmp_path, **overrides):
+    """Returns a Config subclass whose database and data folders live under tmp_path."""
+    instance = tmp_path / 'instance'
+    attrs = {
+        'TESTING': True,
+        'INSTANCE_FOLDER_PATH': str(instance),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'THUMBNAIL_FOLDER': str(tmp_path / 'thumbnails'),
+        'ASSETS_FOLDER': str(tmp_path / 'assets'),
+        'UPLOAD_TMP_FOLDER': str(instance / 'upload_tmp'),
+        'DATABASE_PATH': str(instance / 'showgo.db'),
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{instance / 'showgo.db'}",
+    }
+    attrs.update(overrides)
+    return type('TestConfig', (Config,), attrs)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Creates an app whose database and data folders live under tmp_path."""
+    # Process-wide caches outlive an app; start every test from a clean slate
+    utils._credential_cache.clear()
+    utils._login_attempts.clear()
+    utils.forget_existing_thumbnails()
+    utils.invalidate_settings_cache()
+
+    app = create_app(make_config(tmp_path))
+    with app.app_context():
+        # Skip the forced first-login password change
+        utils.save_setting('auth_password_changed', True)
+    yield app
+    with app.app_context():
+        utils.db.session.remove()
+        utils.db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def auth_headers(password=DEFAULT_PASSWORD, username='admin'):
+    """Returns Basic auth headers for the given credentials."""
+    token = base64.b64encode(f'{username}:{password}'.encode('utf-8')).decode('ascii')
+    return {'Authorization': f'Basic {token}'}
+
+
+def jpeg_bytes(size=(400, 300), noise=False):
+    """Returns a JPEG as a BytesIO; noisy images compress poorly, giving large uploads."""
+    if noise:
+        image = Image.effect_noise(size, 60).convert('RGB')
+    else:
+        image = Image.new('RGB', size, (200, 10, 10))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95)
+    buffer.seek(0)
+    return buffer
+
+
+def wait_for_file(path, timeout=10.0):
+    """Waits for a background job to write path; returns True once it exists."""
+    deadline = time.monotonic() + timeout
+    while not os.path.isfile(path):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def settle_mtimes(*paths):
+    """Backdates paths past the mtime granularity window, so caches may key on them."""
+    old = time.time_ns() - 10 * utils._MTIME_GRANULARITY_NS
+    for path in paths:
+        os.utime(path, ns=(old, old))
+
+
+def settle_app(app):
+    """Settles the database and media folders behind the media-state ETag."""
+    settle_mtimes(app.config['DATABASE_PATH'], app.config['UPLOAD_FOLDER'],
+                  app.config['THUMBNAIL_FOLDER'])
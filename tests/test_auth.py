@@ -0,0 +1,161 @@
+# tests/test_auth.py
+# Basic auth checks, the credential cache and failed-login throttling
+
+import pytest
+
+from showgo import create_app, utils
+from showgo.config import DEFAULT_PASSWORD
+
+from conftest import auth_headers, make_config
+
+
+def _get_general(client, password, remote_addr='10.0.0.1'):
+    return client.get('/config/general', headers=auth_headers(password),
+                      environ_base={'REMOTE_ADDR': remote_addr})
+
+
+def test_wrong_password_is_rejected(client):
+    assert _get_general(client, 'wrong').status_code == 401
+    assert _get_general(client, DEFAULT_PASSWORD).status_code == 200
+
+
+def test_repeated_failures_are_throttled_per_client(client):
+    for attempt in range(utils._LOGIN_RATE_LIMIT_ATTEMPTS):
+        assert _get_general(client, f'wrong{attempt}').status_code == 401
+
+    response = _get_general(client, 'wrong-again')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+    # Other clients are unaffected
+    assert _get_general(client, DEFAULT_PASSWORD, '10.0.0.2').status_code == 200
+
+
+def test_repeating_the_same_wrong_password_is_not_counted_again(client):
+    # Served from the credential cache, so it costs no KDF run
+    for _ in range(utils._LOGIN_RATE_LIMIT_ATTEMPTS * 2):
+        assert _get_general(client, 'wrong').status_code == 401
+
+
+def test_successful_logins_do_not_use_up_the_limit(client):
+    for _ in range(utils._LOGIN_RATE_LIMIT_ATTEMPTS * 2):
+        utils._credential_cache.clear() # Force a real check every time
+        assert _get_general(client, DEFAULT_PASSWORD).status_code == 200
+
+
+def test_throttle_expires_after_the_window(client, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: clock[0])
+    for attempt in range(utils._LOGIN_RATE_LIMIT_ATTEMPTS):
+        _get_general(client, f'wrong{attempt}')
+    assert _get_general(client, 'wrong-again').status_code == 429
+
+    clock[0] += utils._LOGIN_RATE_LIMIT_WINDOW + 1
+    assert _get_general(client, DEFAULT_PASSWORD).status_code == 200
+
+
+def test_update_password_reports_throttling(app, client):
+    for _ in range(utils._LOGIN_RATE_LIMIT_ATTEMPTS):
+        utils._record_login_failure('10.0.0.1', utils.time.monotonic())
+    # Cache the admin's own credentials (from another address), so the request itself is
+    # authenticated and only the uncached current-password check hits the throttle
+    assert _get_general(client, DEFAULT_PASSWORD, '10.0.0.9').status_code == 200
+    response = client.post('/config/update-password', headers=auth_headers(),
+                           environ_base={'REMOTE_ADDR': '10.0.0.1'},
+                           data={'update_current_password': 'not-cached',
+                                 'update_new_password': 'n', 'update_confirm_password': 'n'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        messages = [message for _, message in session.get('_flashes', [])]
+    assert any(message.startswith("Too many incorrect attempts.") for message in messages)
+
+
+def test_tracked_clients_are_capped(monkeypatch):
+    monkeypatch.setattr(utils, '_LOGIN_TRACKED_CLIENTS_MAX', 3)
+    now = 1000.0
+    for client_id in ('a', 'b', 'c', 'd'):
+        utils._record_login_failure(client_id, now)
+    assert list(utils._login_attempts) == ['b', 'c', 'd'] # Oldest dropped, not everyone
+
+
+def test_proxy_fix_keys_throttling_on_forwarded_address(tmp_path):
+    proxied = create_app(make_config(tmp_path / 'proxied', PROXY_FIX_X_FOR=1))
+    client = proxied.test_client()
+    for attempt in range(utils._LOGIN_RATE_LIMIT_ATTEMPTS):
+        client.get('/config/general', headers={**auth_headers(f'wrong{attempt}'),
+                                                'X-Forwarded-For': '203.0.113.5'})
+    assert '203.0.113.5' in utils._login_attempts
+    assert '127.0.0.1' not in utils._login_attempts
+
+    # The proxy's own address isn't throttled for everyone else
+    response = client.get('/config/general', headers={**auth_headers('wrong-again'),
+                                                      'X-Forwarded-For': '203.0.113.6'})
+    assert response.status_code == 401
+
+
+def test_without_proxy_fix_forwarded_for_is_ignored(client):
+    client.get('/config/general', headers={**auth_headers('wrong'), 'X-Forwarded-For': '203.0.113.5'})
+    assert '203.0.113.5' not in utils._login_attempts
+
+
+@pytest.fixture
+def count_kdf(monkeypatch):
+    calls = []
+    real_check = utils.check_password_hash
+    monkeypatch.setattr(utils, 'check_password_hash',
+                        lambda stored, password: calls.append(password) or real_check(stored, password))
+    return calls
+
+
+def test_credential_checks_are_memoized(app, count_kdf):
+    stored = utils.hash_password('secret')
+    with app.app_context():
+        assert utils.check_password_cached(stored, 'secret')
+        assert utils.check_password_cached(stored, 'secret')
+        assert not utils.check_password_cached(stored, 'other')
+        assert not utils.check_password_cached(stored, 'other')
+    assert count_kdf == ['secret', 'other']
+
+
+def test_credential_cache_evicts_expired_entries_first(app, monkeypatch, count_kdf):
+    monkeypatch.setattr(utils, '_CREDENTIAL_CACHE_MAX', 2)
+    clock = [1000.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: clock[0])
+    stored = utils.hash_password('secret')
+    with app.app_context():
+        utils.check_password_cached(stored, 'old')
+        clock[0] += utils._CREDENTIAL_CACHE_TTL + 1
+        utils.check_password_cached(stored, 'secret') # Live login
+        utils.check_password_cached(stored, 'new') # Full: only the expired 'old' goes
+        count_kdf.clear()
+        assert utils.check_password_cached(stored, 'secret')
+    assert count_kdf == []
+
+
+def test_password_change_clears_the_credential_cache(app, client):
+    assert _get_general(client, DEFAULT_PASSWORD).status_code == 200
+    with app.app_context():
+        utils.save_setting('auth_password_hash', utils.hash_password('changed'))
+    assert _get_general(client, DEFAULT_PASSWORD).status_code == 401
+    assert _get_general(client, 'changed').status_code == 200
+
+
+def test_credential_cache_survives_concurrent_use(app, monkeypatch):
+    import threading
+    monkeypatch.setattr(utils, '_CREDENTIAL_CACHE_MAX', 4)
+    monkeypatch.setattr(utils, 'check_password_hash', lambda stored, password: password == 'ok')
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(500):
+                utils.check_password_cached('stored', f'{n}-{i}')
+        except Exception as e: # e.g. "dictionary changed size during iteration"
+            errors.append(e)
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(utils._credential_cache) <= 4
@@ -0,0 +1,92 @@
+# tests/test_config_forms.py
+# Parsing and saving of the general settings form
+
+import pytest
+
+from showgo import utils
+from showgo.config import DEFAULT_SETTINGS_DB
+
+from conftest import auth_headers
+
+
+def _post_general(client, **fields):
+    """Posts the general settings form; returns (response, flashed messages)."""
+    response = client.post('/config/general', headers=auth_headers(), data=fields)
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    return response, flashes
+
+
+def _saved(app, key):
+    with app.app_context():
+        return utils.get_setting(key)
+
+
+def test_fields_are_saved(app, client):
+    response, flashes = _post_general(client, transition_effect='slide', duration_seconds='7',
+                                      overlay_text='Lobby', time_widget_enabled='on',
+                                      burn_in_elements=['overlay', 'widgets'])
+    assert response.status_code == 302
+    assert ('success', "Configuration saved successfully!") in flashes
+    assert _saved(app, 'slideshow_transition_effect') == 'slide'
+    assert _saved(app, 'slideshow_duration_seconds') == 7
+    assert _saved(app, 'overlay_text') == 'Lobby'
+    assert _saved(app, 'widgets_time_enabled') is True
+    assert _saved(app, 'burn_in_prevention_elements') == ['overlay', 'widgets']
+
+
+def test_absent_fields_take_defaults_and_unchecked_boxes_are_false(app, client):
+    _post_general(client)
+    assert _saved(app, 'slideshow_duration_seconds') == DEFAULT_SETTINGS_DB['slideshow_duration_seconds']
+    assert _saved(app, 'overlay_text') == DEFAULT_SETTINGS_DB['overlay_text']
+    assert _saved(app, 'widgets_time_enabled') is False
+    assert _saved(app, 'burn_in_prevention_elements') == []
+
+
+@pytest.mark.parametrize('submitted, expected', [('on', True), ('true', False), ('', False)])
+def test_duration_limit_checkbox_requires_on(app, client, submitted, expected):
+    _post_general(client, video_duration_limit_enabled=submitted, video_random_start_enabled='on')
+    assert _saved(app, 'slideshow_video_duration_limit_enabled') is expected
+    # Random start only applies with a duration limit
+    assert _saved(app, 'slideshow_video_random_start_enabled') is expected
+
+
+def test_random_start_checkbox_requires_on(app, client):
+    _post_general(client, video_duration_limit_enabled='on', video_random_start_enabled='1')
+    assert _saved(app, 'slideshow_video_random_start_enabled') is False
+
+
+@pytest.mark.parametrize('submitted, expected', [('0', 1), ('90', 90), ('99999', 3600)])
+def test_video_duration_limit_is_clamped(app, client, submitted, expected):
+    _post_general(client, video_duration_limit_seconds=submitted)
+    assert _saved(app, 'slideshow_video_duration_limit_seconds') == expected
+
+
+def test_invalid_transition_warns_and_defaults(app, client):
+    _, flashes = _post_general(client, transition_effect='spin')
+    assert ('warning', "Invalid transition effect 'spin'. Defaulting.") in flashes
+    assert _saved(app, 'slideshow_transition_effect') == DEFAULT_SETTINGS_DB['slideshow_transition_effect']
+
+
+def test_invalid_scroll_speed_warns_and_defaults(app, client):
+    _, flashes = _post_general(client, rss_scroll_speed='ludicrous')
+    assert ('warning', "Invalid RSS scroll speed 'ludicrous'. Defaulting.") in flashes
+    assert _saved(app, 'widgets_rss_scroll_speed') == DEFAULT_SETTINGS_DB['widgets_rss_scroll_speed']
+
+
+def test_invalid_display_mode_defaults_silently(app, client):
+    _, flashes = _post_general(client, overlay_display_mode='hologram')
+    assert not [message for category, message in flashes if category == 'warning']
+    assert _saved(app, 'overlay_display_mode') == DEFAULT_SETTINGS_DB['overlay_display_mode']
+
+
+def test_invalid_number_skips_only_that_field(app, client):
+    with app.app_context():
+        before = utils.get_setting('burn_in_prevention_interval_seconds')
+    _, flashes = _post_general(client, duration_seconds='12', burn_in_interval_seconds='soon',
+                               overlay_text='Still saved')
+    assert ('error', "Invalid input value provided for burn_in_interval_seconds (must be numbers). "
+                     "Those settings were not changed.") in flashes
+    assert _saved(app, 'burn_in_prevention_interval_seconds') == before
+    assert _saved(app, 'slideshow_duration_seconds') == 12
+    assert _saved(app, 'overlay_text') == 'Still saved'
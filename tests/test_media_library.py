@@ -0,0 +1,239 @@
+# tests/test_media_library.py
+# Folder listing cache, slideshow media caching and library maintenance
+
+import importlib
+import os
+import time
+
+import pytest
+from sqlalchemy import event
+
+from showgo import utils
+from showgo.models import MediaFile
+
+from conftest import auth_headers, settle_app
+
+main_bp = importlib.import_module('showgo.main_bp')
+
+
+def _touch(folder, name):
+    with open(os.path.join(folder, name), 'wb') as f:
+        f.write(b'x')
+
+
+def _set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _old_ns():
+    return time.time_ns() - 10 * utils._MTIME_GRANULARITY_NS
+
+
+def test_folder_listing_sees_new_files(tmp_path):
+    folder = str(tmp_path)
+    assert utils._get_folder_listing(folder)[2] == frozenset()
+    _touch(folder, 'a.jpg')
+    assert utils._get_folder_listing(folder)[2] == {'a.jpg'}
+
+
+def test_folder_listing_sees_a_file_added_in_the_same_mtime_tick(tmp_path):
+    folder = str(tmp_path)
+    _touch(folder, 'a.jpg')
+    mtime_ns = os.stat(folder).st_mtime_ns
+    assert utils._get_folder_listing(folder)[2] == {'a.jpg'}
+
+    # A coarse-mtime filesystem leaves the directory mtime where it was
+    _touch(folder, 'b.jpg')
+    _set_mtime(folder, mtime_ns)
+    assert utils._get_folder_listing(folder)[2] == {'a.jpg', 'b.jpg'}
+
+
+def test_settled_folder_listing_is_reused(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    _touch(folder, 'a.jpg')
+    _set_mtime(folder, _old_ns())
+    first = utils._get_folder_listing(folder)
+
+    def fail(_):
+        raise AssertionError("settled folder was listed again")
+    monkeypatch.setattr(utils.os, 'scandir', fail)
+    assert utils._get_folder_listing(folder) is first
+
+
+def test_unchanged_relisting_keeps_the_same_objects(tmp_path):
+    folder = str(tmp_path)
+    _touch(folder, 'a.jpg')
+    first = utils._get_folder_listing(folder)
+    # Still inside the window, so this lists again but finds nothing new
+    second = utils._get_folder_listing(folder)
+    assert second is first
+
+
+def test_folder_listing_reports_directories(tmp_path):
+    folder = str(tmp_path)
+    os.mkdir(os.path.join(folder, 'sub'))
+    _touch(folder, 'a.jpg')
+    entries = sorted(utils._list_folder(folder))
+    assert entries == [('a.jpg', False, True), ('sub', True, False)]
+    assert utils._get_folder_listing(folder)[2] == {'a.jpg'}
+
+
+def _add_media(app, uuid, with_file=True):
+    with app.app_context():
+        utils.db.session.add(MediaFile(uuid_filename=uuid, original_filename=f'{uuid}.jpg',
+                                       display_name=uuid, extension='jpg', media_type='image'))
+        utils.db.session.commit()
+    if with_file:
+        _touch(app.config['UPLOAD_FOLDER'], f'{uuid}.jpg')
+
+
+@pytest.fixture
+def count_media_queries(monkeypatch):
+    calls = []
+    real_query = main_bp.get_database_media
+    monkeypatch.setattr(main_bp, 'get_database_media', lambda: calls.append(1) or real_query())
+    return calls
+
+
+def _slideshow_filenames(app):
+    with app.test_request_context():
+        media_list, _ = main_bp._get_slideshow_media(utils.get_settings_version())
+    return [media['filename'] for media in media_list]
+
+
+def test_settled_slideshow_media_is_reused(app, count_media_queries):
+    _add_media(app, 'a')
+    settle_app(app)
+    assert _slideshow_filenames(app) == ['a.jpg']
+    assert _slideshow_filenames(app) == ['a.jpg']
+    assert len(count_media_queries) == 1
+
+
+def test_unsettled_slideshow_media_is_rebuilt(app, count_media_queries):
+    _add_media(app, 'a') # Leaves fresh database and folder mtimes
+    _slideshow_filenames(app)
+    _slideshow_filenames(app)
+    assert len(count_media_queries) == 2
+
+
+def test_slideshow_media_sees_a_new_upload(app):
+    _add_media(app, 'a')
+    settle_app(app)
+    assert _slideshow_filenames(app) == ['a.jpg']
+    _add_media(app, 'b')
+    assert _slideshow_filenames(app) == ['a.jpg', 'b.jpg']
+
+
+def test_slideshow_media_sees_a_deletion(app):
+    _add_media(app, 'a')
+    _add_media(app, 'b')
+    settle_app(app)
+    assert _slideshow_filenames(app) == ['a.jpg', 'b.jpg']
+    with app.app_context():
+        utils.db.session.delete(MediaFile.query.filter_by(uuid_filename='a').one())
+        utils.db.session.commit()
+    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], 'a.jpg'))
+    assert _slideshow_filenames(app) == ['b.jpg']
+
+
+def test_slideshow_media_skips_a_missing_original(app):
+    _add_media(app, 'a')
+    _add_media(app, 'b', with_file=False)
+    settle_app(app)
+    assert _slideshow_filenames(app) == ['a.jpg']
+    # The original turning up later changes the folder listing
+    _touch(app.config['UPLOAD_FOLDER'], 'b.jpg')
+    assert _slideshow_filenames(app) == ['a.jpg', 'b.jpg']
+
+
+def _post_delete(client, *media_ids):
+    response = client.post('/config/delete', headers=auth_headers(),
+                           data={'selected_media': [str(media_id) for media_id in media_ids]})
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    return response, flashes
+
+
+def _media_ids(app):
+    with app.app_context():
+        return {media.uuid_filename: media.id for media in MediaFile.query.all()}
+
+
+def test_bulk_delete_removes_rows_and_files(app, client):
+    for uuid in ('a', 'b', 'c'):
+        _add_media(app, uuid)
+    _touch(app.config['THUMBNAIL_FOLDER'], 'a.png')
+    ids = _media_ids(app)
+
+    response, flashes = _post_delete(client, ids['a'], ids['b'])
+    assert response.status_code == 302
+    assert ('success', "Successfully deleted 2 media file(s).") in flashes
+    assert set(_media_ids(app)) == {'c'}
+    assert sorted(os.listdir(app.config['UPLOAD_FOLDER'])) == ['c.jpg']
+    assert not os.path.exists(os.path.join(app.config['THUMBNAIL_FOLDER'], 'a.png'))
+
+
+def test_bulk_delete_issues_one_select_and_one_delete(app, client):
+    for uuid in ('a', 'b', 'c'):
+        _add_media(app, uuid)
+    ids = _media_ids(app)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if 'media_files' in statement:
+            statements.append(statement.split()[0])
+    with app.app_context():
+        engine = utils.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        _post_delete(client, *ids.values())
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert statements == ['SELECT', 'DELETE']
+
+
+def test_bulk_delete_counts_unknown_and_invalid_ids_as_errors(app, client):
+    _add_media(app, 'a')
+    ids = _media_ids(app)
+
+    _, flashes = _post_delete(client, ids['a'], ids['a'] + 100, 'nope')
+    assert ('success', "Successfully deleted 1 media file(s).") in flashes
+    assert ('error', "Error occurred while deleting 2 media file(s). Check logs.") in flashes
+    assert _media_ids(app) == {}
+
+
+def test_bulk_delete_removes_the_row_when_the_original_is_already_gone(app, client):
+    _add_media(app, 'a', with_file=False)
+    _, flashes = _post_delete(client, _media_ids(app)['a'])
+    assert ('success', "Successfully deleted 1 media file(s).") in flashes
+    assert _media_ids(app) == {}
+
+
+def test_bulk_delete_with_nothing_selected_warns(client):
+    _, flashes = _post_delete(client)
+    assert flashes == [('warning', "No media selected for deletion.")]
+
+
+def test_missing_media_entries_are_removed_in_bulk(app, client):
+    _add_media(app, 'gone1', with_file=False)
+    _add_media(app, 'gone2', with_file=False)
+    _add_media(app, 'kept')
+    ids = _media_ids(app)
+
+    response = client.post('/config/cleanup/missing-db', headers=auth_headers(),
+                           data={'missing_media_ids': [str(ids['gone1']), str(ids['gone2']), 'nope']})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    assert ('error', "Removed 2 missing database entries, but encountered errors with 1 entries. "
+                     "Check logs.") in flashes
+    assert set(_media_ids(app)) == {'kept'}
+    assert os.path.isfile(os.path.join(app.config['UPLOAD_FOLDER'], 'kept.jpg'))
+
+
+def test_already_removed_missing_entries_are_not_counted(app):
+    _add_media(app, 'gone', with_file=False)
+    media_id = _media_ids(app)['gone']
+    with app.test_request_context():
+        assert utils.remove_missing_media_db_entries([str(media_id)]) == (1, 0)
+        assert utils.remove_missing_media_db_entries([str(media_id)]) == (0, 0)
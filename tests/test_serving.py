@@ -0,0 +1,204 @@
+# tests/test_serving.py
+# Media serving headers, thumbnail placeholders and conditional (304) responses
+
+import os
+
+import pytest
+from PIL import Image
+
+from showgo import utils
+from showgo.models import MediaFile
+
+from conftest import auth_headers, jpeg_bytes, settle_app, wait_for_file
+
+
+def _write(folder, name, data=b'x'):
+    with open(os.path.join(folder, name), 'wb') as f:
+        f.write(data)
+
+
+def test_x_accel_redirect_sends_content_type_and_quoted_path(app, client):
+    app.config['X_ACCEL_REDIRECT_PREFIX'] = '/internal'
+    _write(app.config['UPLOAD_FOLDER'], 'a b é.jpg')
+
+    response = client.get('/uploads/a b é.jpg')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['X-Accel-Redirect'] == '/internal/uploads/a%20b%20%C3%A9.jpg'
+    assert response.data == b''
+
+
+def test_x_accel_redirect_rejects_traversal(app, client):
+    app.config['X_ACCEL_REDIRECT_PREFIX'] = '/internal'
+    response = client.get('/uploads/..%2f..%2fetc%2fpasswd')
+    assert response.status_code == 404
+    assert 'X-Accel-Redirect' not in response.headers
+
+
+def test_uploads_stream_from_flask_without_offload(app, client):
+    _write(app.config['UPLOAD_FOLDER'], 'a.jpg', b'data')
+    response = client.get('/uploads/a.jpg')
+    assert response.status_code == 200
+    assert 'X-Accel-Redirect' not in response.headers
+    assert response.data == b'data'
+    response.close()
+
+
+def test_thumbnail_revalidates_with_etag(app, client):
+    folder = app.config['THUMBNAIL_FOLDER']
+    _write(folder, 'thumb.png', b'old')
+
+    response = client.get('/thumbnails/thumb.png')
+    # Rewritten in place by regenerate-thumbnails --all, so never immutable
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+    etag = response.headers['ETag']
+    response.close()
+    response = client.get('/thumbnails/thumb.png', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # A regenerated thumbnail no longer matches the old validator
+    _write(folder, 'thumb.png', b'regenerated')
+    os.utime(os.path.join(folder, 'thumb.png'), (1, 1))
+    response = client.get('/thumbnails/thumb.png', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.data == b'regenerated'
+    response.close()
+
+
+@pytest.fixture
+def placeholder(app, tmp_path):
+    """Points the app at a static folder that has a placeholder thumbnail."""
+    images = tmp_path / 'static' / 'images'
+    images.mkdir(parents=True)
+    Image.new('RGB', (4, 4)).save(images / 'placeholder_thumb.png')
+    app.static_folder = str(tmp_path / 'static')
+    app.config['PLACEHOLDER_THUMB_EXISTS'] = True
+
+
+def _is_placeholder(response):
+    # The placeholder is sent no-cache; real thumbnails are public, no-cache
+    return response.status_code == 200 and response.headers['Cache-Control'] == 'no-cache'
+
+
+def _upload_one(app, client):
+    client.post('/config/upload', headers=auth_headers(),
+                data={'media_files': [(jpeg_bytes(), 'a.jpg')]}, content_type='multipart/form-data')
+    with app.app_context():
+        media = MediaFile.query.one()
+        assert wait_for_file(media.get_thumbnail_path())
+        return media.id, media.get_thumbnail_filename()
+
+
+def test_missing_thumbnail_gets_placeholder(client, placeholder):
+    response = client.get('/thumbnails/not-rendered-yet.png')
+    assert _is_placeholder(response)
+    response.close()
+
+
+def test_deleted_media_thumbnail_falls_back_to_placeholder(app, client, placeholder):
+    media_id, thumbnail_name = _upload_one(app, client)
+    response = client.get(f'/thumbnails/{thumbnail_name}')
+    assert not _is_placeholder(response)
+    response.close()
+
+    client.post('/config/delete', headers=auth_headers(), data={'selected_media': [str(media_id)]})
+    response = client.get(f'/thumbnails/{thumbnail_name}')
+    assert _is_placeholder(response)
+    response.close()
+
+
+def test_cleaned_up_thumbnail_falls_back_to_placeholder(app, client, placeholder):
+    # An orphan (no database row) is removed by the unexpected-items cleanup
+    orphan = 'ab' * 16 + '.png'
+    _write(app.config['THUMBNAIL_FOLDER'], orphan)
+    client.get(f'/thumbnails/{orphan}').close()
+
+    client.post('/config/cleanup/unexpected-items', headers=auth_headers())
+    assert orphan not in os.listdir(app.config['THUMBNAIL_FOLDER'])
+    response = client.get(f'/thumbnails/{orphan}')
+    assert _is_placeholder(response)
+    response.close()
+
+
+def test_thumbnail_removed_by_another_worker_falls_back_to_placeholder(app, client, placeholder):
+    _write(app.config['THUMBNAIL_FOLDER'], 'gone.png')
+    client.get('/thumbnails/gone.png').close()
+    # Deleted behind this process's back, so its remembered path was never forgotten
+    os.remove(os.path.join(app.config['THUMBNAIL_FOLDER'], 'gone.png'))
+
+    response = client.get('/thumbnails/gone.png')
+    assert _is_placeholder(response)
+    response.close()
+
+
+def test_slideshow_answers_304_for_a_matching_etag(app, client):
+    settle_app(app)
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get('/', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_slideshow_etag_changes_with_the_library(app, client):
+    settle_app(app)
+    etag = client.get('/').headers['ETag']
+
+    client.post('/config/upload', headers=auth_headers(),
+                data={'media_files': [(jpeg_bytes(), 'a.jpg')]}, content_type='multipart/form-data')
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'.jpg' in response.data
+
+    with app.app_context():
+        # Let the background thumbnail write land before settling the folders
+        assert wait_for_file(MediaFile.query.one().get_thumbnail_path())
+    settle_app(app)
+    assert client.get('/').headers['ETag'] != etag
+
+
+def test_slideshow_is_not_validated_right_after_a_write(app, client):
+    settle_app(app)
+    etag = client.get('/').headers['ETag']
+    with app.app_context():
+        utils.save_setting('overlay_text', 'Changed')
+    # Inside the mtime granularity window: no ETag, and never a 304
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert b'Changed' in response.data
+
+
+def test_media_page_answers_304_when_nothing_changed(app, client):
+    settle_app(app)
+    response = client.get('/config/media', headers=auth_headers())
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/config/media', headers={**auth_headers(), 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # A deleted original changes the uploads folder, and so the ETag
+    _write(app.config['UPLOAD_FOLDER'], 'stray.txt')
+    settle_app(app)
+    response = client.get('/config/media', headers={**auth_headers(), 'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_media_page_with_pending_messages_is_never_304(app, client):
+    settle_app(app)
+    etag = client.get('/config/media', headers=auth_headers()).headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Deleted 1 media file(s).')]
+
+    response = client.get('/config/media', headers={**auth_headers(), 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Deleted 1 media file(s).' in response.data
+
+
+def test_media_page_requires_auth(client):
+    assert client.get('/config/media').status_code == 401
@@ -0,0 +1,186 @@
+# tests/test_settings.py
+# Settings snapshot caching, invalidation and the config timestamp
+
+import io
+import os
+import sqlite3
+
+import pytest
+from PIL import Image
+
+from showgo import utils
+
+from conftest import auth_headers, settle_app, settle_mtimes
+
+
+def _set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _write_behind_app(app, sql, *params):
+    """Writes the database the way another worker would: no invalidation in this process."""
+    with sqlite3.connect(app.config['DATABASE_PATH']) as conn:
+        conn.execute(sql, params)
+
+
+@pytest.fixture
+def count_queries(monkeypatch):
+    calls = []
+    real_query = utils._query_settings
+    monkeypatch.setattr(utils, '_query_settings', lambda: calls.append(1) or real_query())
+    return calls
+
+
+def test_settled_snapshot_is_reused(app, count_queries):
+    with app.app_context():
+        settle_mtimes(app.config['DATABASE_PATH'])
+        utils.get_setting('auth_username')
+        utils.get_setting('auth_username')
+        utils.get_setting('slideshow_duration_seconds')
+    assert len(count_queries) == 1
+
+
+def test_recent_write_is_not_cached(app, count_queries):
+    with app.app_context():
+        utils.save_setting('slideshow_duration_seconds', 9) # Leaves a fresh mtime
+        utils.get_setting('slideshow_duration_seconds')
+        utils.get_setting('slideshow_duration_seconds')
+    assert len(count_queries) == 2
+
+
+def test_write_by_another_worker_in_the_same_mtime_tick_is_seen(app):
+    db_path = app.config['DATABASE_PATH']
+    with app.app_context():
+        utils.save_setting('auth_username', 'admin')
+        mtime_ns = os.stat(db_path).st_mtime_ns
+        assert utils.get_setting('auth_username') == 'admin'
+
+        _write_behind_app(app, "UPDATE settings SET value = ? WHERE key = 'auth_username'", '"kiosk"')
+        _set_mtime(db_path, mtime_ns)
+        assert utils.get_setting('auth_username') == 'kiosk'
+        assert utils.get_auth_credentials()[0] == 'kiosk'
+
+
+def test_write_by_another_worker_invalidates_settled_snapshot(app):
+    db_path = app.config['DATABASE_PATH']
+    with app.app_context():
+        settle_mtimes(db_path)
+        assert utils.get_setting('auth_username') == 'admin'
+        # A later commit always moves a settled mtime forward
+        _write_behind_app(app, "UPDATE settings SET value = ? WHERE key = 'auth_username'", '"kiosk"')
+        assert utils.get_setting('auth_username') == 'kiosk'
+
+
+def test_save_setting_is_seen_immediately(app):
+    with app.app_context():
+        settle_mtimes(app.config['DATABASE_PATH'])
+        assert utils.get_setting('slideshow_duration_seconds') != 42
+        assert utils.save_setting('slideshow_duration_seconds', 42)
+        assert utils.get_setting('slideshow_duration_seconds') == 42
+
+
+def test_saving_an_unchanged_value_writes_nothing(app):
+    db_path = app.config['DATABASE_PATH']
+    with app.app_context():
+        current = utils.get_setting('slideshow_duration_seconds')
+        settle_mtimes(db_path)
+        mtime_ns = os.stat(db_path).st_mtime_ns
+        assert utils.save_setting('slideshow_duration_seconds', current)
+        assert os.stat(db_path).st_mtime_ns == mtime_ns
+
+
+def test_initialize_database_rechecks_after_a_same_tick_write(app):
+    db_path = app.config['DATABASE_PATH']
+    with app.app_context():
+        assert utils.initialize_database()
+        mtime_ns = os.stat(db_path).st_mtime_ns
+        _write_behind_app(app, "DELETE FROM settings WHERE key = 'slideshow_duration_seconds'")
+        _set_mtime(db_path, mtime_ns)
+
+        assert utils.initialize_database()
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT 1 FROM settings WHERE key = 'slideshow_duration_seconds'").fetchone()
+
+
+def test_media_state_etag_waits_for_settled_mtimes(app):
+    with app.app_context():
+        assert utils.get_media_state_etag() is None # Everything was just created
+        settle_app(app)
+        etag = utils.get_media_state_etag()
+        assert etag is not None
+        assert utils.get_media_state_etag() == etag
+
+
+def test_overlay_logo_upload_bumps_config_timestamp(app, client, monkeypatch):
+    monkeypatch.setattr(utils, '_TIMESTAMP_CACHE_TTL', 0)
+    before = client.get('/api/config/check').get_json()['timestamp']
+
+    logo = io.BytesIO()
+    Image.new('RGBA', (10, 10)).save(logo, 'PNG')
+    logo.seek(0)
+    response = client.post('/config/upload_overlay_logo', headers=auth_headers(),
+                           data={'overlay_logo_file': (logo, 'logo.png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    after = client.get('/api/config/check').get_json()['timestamp']
+    assert after > before
+
+
+@pytest.fixture
+def count_schema_checks(monkeypatch):
+    calls = []
+    real_create_all = utils.db.create_all
+    monkeypatch.setattr(utils.db, 'create_all', lambda *args, **kwargs: calls.append(1) or real_create_all(*args, **kwargs))
+    return calls
+
+
+def test_initialize_database_skips_an_unchanged_settled_database(app, count_schema_checks):
+    with app.app_context():
+        settle_mtimes(app.config['DATABASE_PATH'])
+        assert utils.initialize_database()
+        assert utils.initialize_database()
+    assert len(count_schema_checks) == 1
+
+
+def test_initialize_database_repeats_inside_the_mtime_window(app, count_schema_checks):
+    with app.app_context():
+        utils.save_setting('slideshow_duration_seconds', 9) # Leaves a fresh mtime
+        assert utils.initialize_database()
+        assert utils.initialize_database()
+    assert len(count_schema_checks) == 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def count_timestamp_queries(monkeypatch):
+    calls = []
+    real_query = utils._query_config_timestamp
+    monkeypatch.setattr(utils, '_query_config_timestamp', lambda: calls.append(1) or real_query())
+    return calls
+
+
+def test_config_timestamp_is_cached_per_settled_version(app, clock, count_timestamp_queries):
+    with app.app_context():
+        settle_mtimes(app.config['DATABASE_PATH'])
+        first = utils.get_config_timestamp_from_db()
+        assert utils.get_config_timestamp_from_db() == first # Within the TTL
+        clock[0] += utils._TIMESTAMP_CACHE_TTL + 1
+        assert utils.get_config_timestamp_from_db() == first # Expired, but the version is unchanged
+    assert len(count_timestamp_queries) == 1
+
+
+def test_config_timestamp_follows_a_save_immediately(app, clock, count_timestamp_queries):
+    with app.app_context():
+        settle_mtimes(app.config['DATABASE_PATH'])
+        first = utils.get_config_timestamp_from_db()
+        clock[0] += 0.1 # Still inside the TTL
+        utils.save_setting('overlay_text', 'Changed')
+        assert utils.get_config_timestamp_from_db() >= first
+    assert len(count_timestamp_queries) == 2
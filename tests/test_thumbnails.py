@@ -0,0 +1,76 @@
+# tests/test_thumbnails.py
+# Thumbnail generation and its pyvips -> Pillow fallback
+
+import os
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from showgo import utils
+
+
+@pytest.fixture
+def work_dir(tmp_path):
+    path = tmp_path / 'work'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def source(work_dir):
+    path = work_dir / 'source.jpg'
+    Image.new('RGB', (640, 480), (10, 120, 200)).save(path, 'JPEG')
+    return str(path)
+
+
+def _fake_vips(monkeypatch, thumbnail):
+    monkeypatch.setattr(utils, 'VIPS_AVAILABLE', True)
+    monkeypatch.setattr(utils, 'pyvips', SimpleNamespace(Image=SimpleNamespace(thumbnail=thumbnail)),
+                        raising=False)
+
+
+def _generate(app, source, dest):
+    with app.app_context():
+        return utils.generate_thumbnail(source, dest, (150, 150), 'image')
+
+
+def test_pillow_thumbnail_fits_the_box(app, source, work_dir):
+    dest = str(work_dir / 'thumb.png')
+    assert _generate(app, source, dest) == (True, dest)
+    with Image.open(dest) as thumb:
+        assert thumb.width == 150 and thumb.height <= 150 # Aspect ratio kept
+    assert sorted(os.listdir(work_dir)) == ['source.jpg', 'thumb.png']
+
+
+@pytest.mark.parametrize('error', [OSError("disk full"), TypeError("odd input")])
+def test_vips_write_failure_falls_back_to_pillow(app, source, work_dir, monkeypatch, error):
+    def write_partially(path):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+        raise error
+    _fake_vips(monkeypatch, lambda *args, **kwargs: SimpleNamespace(write_to_file=write_partially))
+
+    dest = str(work_dir / 'thumb.png')
+    assert _generate(app, source, dest) == (True, dest)
+    with Image.open(dest) as thumb:
+        assert thumb.format == 'PNG'
+    # The partial vips output was removed, not left beside the thumbnail
+    assert sorted(os.listdir(work_dir)) == ['source.jpg', 'thumb.png']
+
+
+def test_vips_load_failure_falls_back_to_pillow(app, source, work_dir, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("unsupported")
+    _fake_vips(monkeypatch, fail)
+
+    dest = str(work_dir / 'thumb.png')
+    assert _generate(app, source, dest) == (True, dest)
+
+
+def test_unreadable_image_reports_failure(app, work_dir):
+    source = work_dir / 'broken.jpg'
+    source.write_bytes(b'not an image')
+    dest = str(work_dir / 'thumb.png')
+    assert _generate(app, str(source), dest) == (False, None)
+    assert not os.path.exists(dest)
@@ -0,0 +1,132 @@
+# tests/test_uploads.py
+# Upload path: spooled/linked files, duplicate thumbnails, batch commits
+
+import importlib
+import os
+
+from showgo import utils
+from showgo.models import MediaFile
+
+from conftest import auth_headers, jpeg_bytes, wait_for_file
+
+# The package re-exports the blueprint under the module's name
+config_bp_module = importlib.import_module('showgo.config_bp')
+
+
+def _upload(client, *files):
+    return client.post('/config/upload', headers=auth_headers(),
+                       data={'media_files': list(files)}, content_type='multipart/form-data')
+
+
+def _media(app):
+    with app.app_context():
+        return [(m.id, m.get_upload_path(), m.get_thumbnail_path())
+                for m in MediaFile.query.order_by(MediaFile.id)]
+
+
+def test_large_upload_gets_normal_file_mode(app, client):
+    upload = jpeg_bytes((1200, 1000), noise=True)
+    # Above UploadRequest's in-memory limit, so it is spooled and hard-linked into place
+    assert len(upload.getvalue()) > utils.UploadRequest._IN_MEMORY_MAX
+    response = _upload(client, (upload, 'big.jpg'))
+    assert response.status_code == 302
+
+    [(_, upload_path, _)] = _media(app)
+    umask = os.umask(0)
+    os.umask(umask)
+    # Same mode as an ordinary open() would give, not NamedTemporaryFile's 0600
+    assert os.stat(upload_path).st_mode & 0o777 == 0o666 & ~umask
+    # The spooled temp file was linked, then closed and unlinked
+    assert os.listdir(app.config['UPLOAD_TMP_FOLDER']) == []
+
+
+def test_small_upload_is_written_directly(app, client):
+    upload = jpeg_bytes()
+    assert len(upload.getvalue()) <= utils.UploadRequest._IN_MEMORY_MAX
+    assert _upload(client, (upload, 'small.jpg')).status_code == 302
+
+    [(_, upload_path, _)] = _media(app)
+    assert os.path.isfile(upload_path)
+    # Nothing is left behind in the spool folder
+    assert os.listdir(app.config['UPLOAD_TMP_FOLDER']) == []
+
+
+def test_identical_upload_reuses_thumbnail(app, client, monkeypatch):
+    _upload(client, (jpeg_bytes(), 'first.jpg'))
+    [(_, _, first_thumb)] = _media(app)
+    assert wait_for_file(first_thumb)
+
+    queued = []
+    monkeypatch.setattr(config_bp_module, 'submit_thumbnail_job', lambda *args: queued.append(args))
+    assert _upload(client, (jpeg_bytes(), 'second.jpg')).status_code == 302
+    (_, _, _), (_, _, second_thumb) = _media(app)
+    # Linked from the first upload rather than queued for the thumbnail pool
+    assert queued == []
+    with open(first_thumb, 'rb') as first, open(second_thumb, 'rb') as second:
+        assert first.read() == second.read()
+
+
+def test_different_upload_queues_its_own_thumbnail(app, client, monkeypatch):
+    _upload(client, (jpeg_bytes(), 'first.jpg'))
+    [(_, _, first_thumb)] = _media(app)
+    assert wait_for_file(first_thumb)
+
+    queued = []
+    monkeypatch.setattr(config_bp_module, 'submit_thumbnail_job', lambda *args: queued.append(args))
+    _upload(client, (jpeg_bytes(noise=True), 'other.jpg'))
+    (_, _, _), (_, _, other_thumb) = _media(app)
+    assert [args[1] for args in queued] == [other_thumb]
+
+
+def test_upload_batch_is_committed_once(app, client, monkeypatch):
+    from showgo.extensions import db
+    commits = []
+    real_commit = db.session.commit
+    monkeypatch.setattr(db.session, 'commit', lambda: commits.append(1) or real_commit())
+    _upload(client, (jpeg_bytes(), 'a.jpg'), (jpeg_bytes(noise=True), 'b.jpg'), (jpeg_bytes((90, 90)), 'c.jpg'))
+    assert len(_media(app)) == 3
+    # One for the batch; the media timestamp bump is the other
+    assert len(commits) == 2
+
+
+def test_failed_batch_commit_discards_the_whole_batch(app, client, monkeypatch):
+    from showgo.extensions import db
+
+    def fail():
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db.session, 'commit', fail)
+    response = _upload(client, (jpeg_bytes(), 'a.jpg'), (jpeg_bytes(noise=True), 'b.jpg'))
+    assert response.status_code == 302
+    monkeypatch.undo()
+
+    with client.session_transaction() as session:
+        flashes = session.pop('_flashes', [])
+    assert ('error', "Database error while saving this upload: none of its 2 processed file(s) "
+                     "were added. Please upload them again.") in flashes
+    assert _media(app) == []
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
+    assert os.listdir(app.config['THUMBNAIL_FOLDER']) == []
+
+
+def test_staged_rows_are_not_flushed_before_the_batch_commit(app, client):
+    from sqlalchemy import event
+    from showgo.extensions import db
+    _upload(client, (jpeg_bytes(), 'first.jpg'))
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split(None, 3)[:3])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            # Every file is a duplicate, so each one runs the content-hash lookup
+            _upload(client, (jpeg_bytes(), 'a.jpg'), (jpeg_bytes(), 'b.jpg'), (jpeg_bytes(), 'c.jpg'))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    inserts = [i for i, words in enumerate(statements) if words[:3] == ['INSERT', 'INTO', 'media_files']]
+    assert len(inserts) == 3
+    # No INSERT (and so no SQLite write lock) before the last file's lookup
+    assert inserts == list(range(inserts[0], inserts[0] + 3))
+    lookups = [i for i, words in enumerate(statements) if words[0] == 'SELECT']
+    assert sum(1 for i in lookups if i < inserts[0]) >= 3
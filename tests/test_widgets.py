@@ -0,0 +1,183 @@
+# tests/test_widgets.py
+# Widget data cache and background refresh (no network: the fetchers are replaced)
+
+import pytest
+
+from showgo import widgets
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Replaces the fetchers; returns the list of keys fetched and a dict of canned results."""
+    calls = []
+    results = {}
+
+    def fake(kind):
+        def fetch(*args):
+            calls.append((kind, *args))
+            return results.get((kind, *args), (f'{kind} data', None))
+        return fetch
+    monkeypatch.setattr(widgets, '_widget_cache', {})
+    monkeypatch.setattr(widgets, '_ensure_refresher', lambda refresh_seconds: None)
+    monkeypatch.setitem(widgets._FETCHERS, 'weather', fake('weather'))
+    monkeypatch.setitem(widgets._FETCHERS, 'rss', fake('rss'))
+    return calls, results
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(widgets.time, 'monotonic', lambda: now[0])
+    return now
+
+
+WEATHER = ('weather', 'Chicago', 'key')
+RSS = ('rss', 'https://example.com/feed', 'ShowGo')
+
+
+def test_first_request_fetches_and_later_ones_are_cached(fetches):
+    calls, _ = fetches
+    assert widgets.get_widget_data(900, {'weather': WEATHER}) == {'weather': ('weather data', None)}
+    assert widgets.get_widget_data(900, {'weather': WEATHER}) == {'weather': ('weather data', None)}
+    assert calls == [WEATHER]
+
+
+def test_refresher_refetches_only_stale_entries(fetches, clock):
+    calls, results = fetches
+    widgets.get_widget_data(900, {'weather': WEATHER})
+    clock[0] += 899
+    widgets._refresh_stale_entries(900)
+    assert calls == [WEATHER]
+
+    clock[0] += 1
+    results[WEATHER] = ('new weather', None)
+    widgets._refresh_stale_entries(900)
+    assert calls == [WEATHER, WEATHER]
+    assert widgets.get_widget_data(900, {'weather': WEATHER}) == {'weather': ('new weather', None)}
+
+
+def test_idle_entries_are_dropped(fetches, clock):
+    calls, _ = fetches
+    widgets.get_widget_data(900, {'weather': WEATHER})
+    clock[0] += widgets._WIDGET_IDLE_EXPIRY + 1
+    widgets._refresh_stale_entries(900)
+    assert widgets._widget_cache == {}
+    assert calls == [WEATHER] # Dropped, not refreshed
+
+
+RSS_DOC = (b'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>'
+           b'<item><title>First</title><link>https://example.com/1</link></item>'
+           b'<item><title>Second</title></item></channel></rss>')
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise widgets.requests.exceptions.HTTPError(f'{self.status_code} Error')
+
+
+@pytest.fixture
+def feed_server(monkeypatch):
+    """Serves queued FakeResponses from the widget session; returns (queue, request headers)."""
+    queue = []
+    sent_headers = []
+
+    def get(url, headers=None, timeout=None):
+        sent_headers.append(headers or {})
+        return queue.pop(0)
+    monkeypatch.setattr(widgets, '_rss_validators', {})
+    monkeypatch.setattr(widgets._session, 'get', get)
+    return queue, sent_headers
+
+
+def test_rss_revalidates_with_conditional_get(feed_server):
+    queue, sent_headers = feed_server
+    queue.append(FakeResponse(content=RSS_DOC, headers={'ETag': '"v1"', 'Last-Modified': 'Tue, 01 Jul 2025 00:00:00 GMT'}))
+    headlines, error = widgets._fetch_rss(RSS[1], RSS[2])
+    assert error is None
+    assert [headline['title'] for headline in headlines] == ['First', 'Second']
+
+    queue.append(FakeResponse(status_code=304))
+    assert widgets._fetch_rss(RSS[1], RSS[2]) == (headlines, None)
+    assert sent_headers[1]['If-None-Match'] == '"v1"'
+    assert sent_headers[1]['If-Modified-Since'] == 'Tue, 01 Jul 2025 00:00:00 GMT'
+    assert sent_headers[1]['User-Agent'] == RSS[2]
+
+
+def test_rss_error_is_reported_not_raised(feed_server):
+    queue, _ = feed_server
+    queue.append(FakeResponse(status_code=503))
+    headlines, error = widgets._fetch_rss(RSS[1], RSS[2])
+    assert headlines is None
+    assert error.startswith("Fetch/Parse Error:")
+
+
+def test_cold_misses_are_fetched_concurrently(fetches, monkeypatch):
+    import threading
+    both_started = threading.Barrier(2, timeout=5)
+
+    def fetch(*args):
+        both_started.wait() # Times out (BrokenBarrierError) unless both run at once
+        return 'data', None
+    monkeypatch.setitem(widgets._FETCHERS, 'weather', fetch)
+    monkeypatch.setitem(widgets._FETCHERS, 'rss', fetch)
+    assert widgets.get_widget_data(900, {'weather': WEATHER, 'rss': RSS}) == {
+        'weather': ('data', None), 'rss': ('data', None)}
+
+
+def test_fast_parser_reads_plain_rss():
+    assert widgets._parse_rss_fast(RSS_DOC) == [
+        {'title': 'First', 'link': 'https://example.com/1'}, {'title': 'Second', 'link': '#'}]
+
+
+@pytest.mark.parametrize('content', [
+    b'<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>Atom</title></entry></feed>',
+    b'<!DOCTYPE rss [<!ENTITY e "x">]><rss><channel><item><title>&e;</title></item></channel></rss>',
+    b'<rss><channel><item><title>&lt;b&gt;Bold&lt;/b&gt;</title></item></channel></rss>',
+    b'<rss><channel><item><title>Broken',
+    b'<rss><channel></channel></rss>',
+])
+def test_fast_parser_defers_to_feedparser(content):
+    assert widgets._parse_rss_fast(content) is None
+
+
+def test_atom_feed_falls_back_to_feedparser(feed_server):
+    queue, _ = feed_server
+    queue.append(FakeResponse(content=b'<feed xmlns="http://www.w3.org/2005/Atom"><title>Feed</title>'
+                                      b'<entry><title>Atom entry</title><link href="https://example.com/a"/></entry></feed>'))
+    headlines, error = widgets._fetch_rss(RSS[1], RSS[2])
+    assert error is None
+    assert headlines == [{'title': 'Atom entry', 'link': 'https://example.com/a'}]
+
+
+def test_failed_fetch_is_cached_but_retried_sooner(fetches, clock):
+    calls, results = fetches
+    results[WEATHER] = (None, "Network/API Error: timed out")
+    assert widgets.get_widget_data(900, {'weather': WEATHER}) == {'weather': (None, "Network/API Error: timed out")}
+    # Other page loads don't retry inline
+    widgets.get_widget_data(900, {'weather': WEATHER})
+    assert calls == [WEATHER]
+
+    clock[0] += widgets._WIDGET_ERROR_RETRY_SECONDS - 1
+    widgets._refresh_stale_entries(900)
+    assert calls == [WEATHER]
+
+    clock[0] += 1
+    del results[WEATHER]
+    widgets._refresh_stale_entries(900)
+    assert calls == [WEATHER, WEATHER]
+    assert widgets.get_widget_data(900, {'weather': WEATHER}) == {'weather': ('weather data', None)}
+
+
+def test_error_retry_never_waits_longer_than_the_refresh_interval(fetches, clock):
+    calls, results = fetches
+    results[RSS] = (None, "Feed Empty")
+    widgets.get_widget_data(30, {'rss': RSS})
+    clock[0] += 30
+    widgets._refresh_stale_entries(30)
+    assert calls == [RSS, RSS]
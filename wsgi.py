@@ -0,0 +1,9 @@
+# wsgi.py
+# WSGI entry point for production servers, e.g.:
+#   gunicorn -w 4 -k gthread --threads 4 -b 0.0.0.0:5000 wsgi:application
+
+from showgo import create_app # Import the factory function
+
+# Create the Flask app instance using the factory
+application = create_app()
+app = application # Alias for servers/tools that look for 'app'